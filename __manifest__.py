@@ -11,12 +11,17 @@
     'depends': ['website', 'web', 'in_clue_event_surveys'],
     'data': [
         'security/ir.model.access.csv',
+        'data/dashboard_cron.xml',
         'views/dashboard_templates.xml',
         'views/dashboard_snippets.xml',
         'views/dashboard_views.xml',
     ],
     'assets': {
         'web.assets_frontend': [
+            'dashboard_custom/static/src/js/dashboard_loader.js',
+        ],
+        # Loaded on demand by dashboard_loader.js, only on pages with a dashboard
+        'dashboard_custom.assets_dashboard': [
             'dashboard_custom/static/src/js/dashboard_snippet.js',
         ],
     },
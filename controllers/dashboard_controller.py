@@ -1,55 +1,241 @@
 from odoo import http
 from odoo.http import request
+import functools
+import gzip
+import hmac
+import json
 import logging
+import random
+import threading
+import time
+import uuid
+
+from ..models.dashboard_component import CARD_META_FIELDS
+from ..tools import metrics
+from ..tools.structured_logging import get_sampled_logger
 
 _logger = logging.getLogger(__name__)
+# Per-request logging, sampled and lazily formatted
+_request_logger = get_sampled_logger(__name__ + '.request')
+
+# Compact responses smaller than this are not worth compressing
+GZIP_MIN_SIZE = 1024
+
+# Share of the JSON-RPC responses whose size is measured: their body is only
+# serialized by the dispatcher, after the route returns, so measuring means
+# serializing the result a second time
+JSON_SIZE_SAMPLE_RATE = 0.05
+
+
+def _query_count():
+    """SQL statements executed so far by the current request thread"""
+    return getattr(threading.current_thread(), 'query_count', 0)
+
+
+def _request_id():
+    """Id correlating the log records of one dashboard request, taken from the
+    X-Request-Id header set by the proxy when there is one"""
+    return request.httprequest.headers.get('X-Request-Id') or uuid.uuid4().hex[:12]
+
+
+def observed(route):
+    """Record request count, status, latency, SQL statements and payload size
+    of a route; the size of JSON-RPC results is only sampled"""
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            started = time.monotonic()
+            queries = _query_count()
+            status = 'error'
+            try:
+                result = method(self, *args, **kwargs)
+                if isinstance(result, dict):
+                    status = 'error' if 'error' in result else 'ok'
+                    if random.random() < JSON_SIZE_SAMPLE_RATE:
+                        metrics.RESPONSE_BYTES.observe(
+                            len(json.dumps(result, default=str).encode('utf-8')), route=route)
+                else:
+                    status = 'ok' if result.status_code < 400 else 'error'
+                    metrics.RESPONSE_BYTES.observe(len(result.get_data()), route=route)
+                return result
+            finally:
+                metrics.REQUESTS.inc(route=route, status=status)
+                metrics.REQUEST_DURATION.observe(time.monotonic() - started, route=route)
+                metrics.REQUEST_SQL_QUERIES.observe(_query_count() - queries, route=route)
+        return wrapper
+    return decorator
+
 
 class DashboardController(http.Controller):
-    
+
+    def _get_compact_payload(self, components, values, meta_version=None, ages=None):
+        """Columnar refresh payload; static metadata is only sent when the
+        client's cached version is outdated
+
+        The metadata covers every card of the boards refreshed, not just the
+        requested ones, so its version does not change with the cards in view.
+        """
+        board_cards = components._get_board_cards()
+        version = board_cards._get_meta_version()
+        payload = {
+            'version': version,
+            'ids': components.ids,
+            'values': [values[cid] for cid in components.ids],
+        }
+        if ages:
+            # Seconds since the values of rate-limited or reused cards were computed
+            payload['ages'] = [int(ages.get(cid, 0)) for cid in components.ids]
+        if meta_version != version:
+            payload['meta'] = {
+                'fields': CARD_META_FIELDS,
+                'rows': board_cards._get_card_meta(),
+            }
+        return payload
+
     @http.route('/dashboard/refresh_data', type='json', auth='user', website=True)
-    def refresh_dashboard_data(self):
-        _logger.info("Dashboard refresh requested")
+    @observed('refresh_data')
+    def refresh_dashboard_data(self, board_id=None, component_ids=None, compact=False, meta_version=None):
+        return self._refresh_data(board_id, component_ids, compact, meta_version)
+
+    def _refresh_data(self, board_id=None, component_ids=None, compact=False, meta_version=None):
+        started = time.monotonic()
+        request_id = _request_id()
         try:
-            # Get all active dashboard components
-            components = request.env['dashboard.custom.component'].search([
-                ('is_active', '=', True),
-                ('component_type', '=', 'card')
-            ])
-            
+            # Only the requested board's (visible) cards are evaluated
+            Component = request.env['dashboard.custom.component'].with_context(dashboard_request_id=request_id)
+            components = Component._get_dashboard_cards(board_id=board_id, component_ids=component_ids)
+
+            # Concurrent identical requests share a single computation per card
+            ages = {}
+            values = components._compute_cards_shared(ages=ages)
+
+            if compact:
+                result = self._get_compact_payload(components, values, meta_version, ages)
+                _request_logger.debug("Dashboard refreshed", request_id=request_id, compact=True,
+                                      cards=len(components), duration_ms=round((time.monotonic() - started) * 1000, 1))
+                return result
+
             # Build result dictionary with component ID and calculated value
             result = {}
             for component in components:
                 result[component.id] = {
-                    'value': component._compute_card_data(),
+                    'value': values[component.id],
                     'name': component.name,
                     'subtitle': component.card_subtitle or '',
                     'color': component.card_color,
-                    'icon': component.icon or ''
+                    'icon': component.icon or '',
+                    'age': int(ages.get(component.id, 0)),
                 }
-                
-            _logger.info(f"Dashboard refresh successful, returning data for {len(components)} components")
+
+            _request_logger.debug("Dashboard refreshed", request_id=request_id,
+                                  cards=len(components), duration_ms=round((time.monotonic() - started) * 1000, 1))
             return result
         except Exception as e:
-            _logger.error(f"Error refreshing dashboard data: {str(e)}")
+            _logger.error("Error refreshing dashboard data [request_id=%s]: %s", request_id, e)
             return {'error': str(e)}
-    
+
+    @http.route('/dashboard/refresh_data/compact', type='http', auth='user', methods=['GET'], website=True)
+    @observed('refresh_data_compact')
+    def refresh_dashboard_data_compact(self, board_id=None, ids=None, meta_version=None, **kwargs):
+        """Compact refresh over plain HTTP, gzip-compressed when the client accepts it
+
+        :param ids: comma-separated component ids to refresh (all cards of the
+                    board when omitted)
+        """
+        component_ids = [int(cid) for cid in ids.split(',') if cid] if ids else None
+        payload = self._refresh_data(
+            board_id=board_id, component_ids=component_ids, compact=True, meta_version=meta_version)
+        body = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+
+        headers = [
+            ('Content-Type', 'application/json; charset=utf-8'),
+            ('Cache-Control', 'no-store'),
+            ('Vary', 'Accept-Encoding'),
+        ]
+        accept_encoding = request.httprequest.headers.get('Accept-Encoding', '')
+        if len(body) >= GZIP_MIN_SIZE and 'gzip' in accept_encoding.lower():
+            body = gzip.compress(body, compresslevel=5)
+            headers.append(('Content-Encoding', 'gzip'))
+        return request.make_response(body, headers=headers)
+
     @http.route('/dashboard/get_components', type='json', auth='user', website=True)
-    def get_dashboard_components(self):
-        """Return the full HTML for all dashboard components"""
+    @observed('get_components')
+    def get_dashboard_components(self, board_id=None, component_ids=None, structured=False, known_ids=None):
+        """Return the full HTML for the dashboard components of a board
+
+        When ``component_ids`` is given (lazy loading of cards scrolled into
+        view), only the HTML of those cards is returned, keyed by id.
+
+        With ``structured``, the ordered card list is returned instead of the
+        rebuilt HTML, so the widget can patch only what changed; HTML is only
+        included for the cards missing from the page (``known_ids``).
+        """
+        request_id = _request_id()
         try:
-            # Get components
-            components = request.env['dashboard.custom.component'].search([
-                ('is_active', '=', True), 
-                ('component_type', '=', 'card')
-            ], order='sequence')
-            
-            # In Odoo 16, we use _render instead of render_template
-            html = request.env['ir.qweb']._render(
-                'dashboard_custom.dashboard_snippet_content',
-                {'components': components}
-            )
-            
+            Component = request.env['dashboard.custom.component'].with_context(dashboard_request_id=request_id)
+            components = Component._get_dashboard_cards(board_id=board_id, component_ids=component_ids)
+
+            if component_ids is not None:
+                return {'fragments': components._render_card_fragments()}
+
+            board = request.env['dashboard.custom.board'].browse(int(board_id)) if board_id else None
+            eager_count = board.eager_card_count if board and board.exists() else 0
+
+            if structured:
+                cards = components._get_structured_cards(eager_count=eager_count)
+                values = {card['id']: card['value'] for card in cards if not card.get('lazy')}
+                known = set(int(cid) for cid in known_ids or [])
+                new_cards = components.filtered(lambda c: c.id not in known)
+                new_eager = new_cards.filtered(lambda c: c.id in values)
+                fragments = new_eager._render_card_fragments(values)
+                fragments.update((new_cards - new_eager)._render_card_placeholders())
+                return {'cards': cards, 'fragments': fragments}
+
+            # Only cards whose value, definition or language changed are re-rendered
+            html = components._render_dashboard_html(eager_count=eager_count)
+
             return {'html': html}
         except Exception as e:
-            _logger.error(f"Error getting dashboard components: {str(e)}")
-            return {'error': str(e)}
\ No newline at end of file
+            _logger.error("Error getting dashboard components [request_id=%s]: %s", request_id, e)
+            return {'error': str(e)}
+
+    @http.route('/dashboard/drilldown', type='json', auth='user', website=True)
+    @observed('drilldown')
+    def get_dashboard_drilldown(self, component_id):
+        """Facet counts behind a card, for the cards configured with drill-down fields"""
+        request_id = _request_id()
+        try:
+            Component = request.env['dashboard.custom.component'].with_context(dashboard_request_id=request_id)
+            component = Component._get_dashboard_cards(component_ids=[component_id])
+            if not component or not component.drilldown_groupby:
+                return {'error': "No drill-down for this card"}
+            result = component._get_drilldown()
+            result.update(component_id=component.id, name=component.name)
+            return result
+        except Exception as e:
+            _logger.error("Error getting dashboard drill-down [request_id=%s]: %s", request_id, e)
+            return {'error': str(e)}
+
+    @http.route('/dashboard/metrics', type='http', auth='public', methods=['GET'], csrf=False)
+    def dashboard_metrics(self, token=None, **kwargs):
+        """Dashboard metrics of all the server processes in the Prometheus text format
+
+        Scrapers authenticate with the ``dashboard_custom.metrics_token`` system
+        parameter, as a bearer token or a ``token`` query parameter. Without a
+        configured token, only logged-in administrators can read the metrics.
+        """
+        expected = request.env['ir.config_parameter'].sudo().get_param('dashboard_custom.metrics_token')
+        authorization = request.httprequest.headers.get('Authorization', '')
+        if authorization.startswith('Bearer '):
+            token = authorization[len('Bearer '):]
+        if expected:
+            # compare_digest only accepts ASCII str, any bytes
+            allowed = bool(token) and hmac.compare_digest(token.encode('utf-8'), expected.encode('utf-8'))
+        else:
+            allowed = request.env.user.has_group('base.group_system')
+        if not allowed:
+            return request.make_response('Forbidden', status=403, headers=[('Content-Type', 'text/plain')])
+        return request.make_response(metrics.registry.render(), headers=[
+            ('Content-Type', 'text/plain; version=0.0.4; charset=utf-8'),
+            ('Cache-Control', 'no-store'),
+        ])
@@ -1,2 +1,9 @@
+from . import dashboard_board
 from . import dashboard_component
-# from . import dashboard_extensions
\ No newline at end of file
+from . import dashboard_component_validation
+from . import dashboard_dependency
+from . import dashboard_drilldown
+from . import dashboard_hll_sketch
+from . import dashboard_value
+from . import dashboard_warmup
+# from . import dashboard_extensions
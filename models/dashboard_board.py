@@ -0,0 +1,28 @@
+from odoo import models, fields, api
+
+
+class DashboardBoard(models.Model):
+    _name = "dashboard.custom.board"
+    _description = "Dashboard Board"
+    _order = "sequence, id"
+
+    name = fields.Char("Board Name", required=True)
+    active = fields.Boolean("Active", default=True)
+    sequence = fields.Integer("Sequence", default=10)
+    component_ids = fields.One2many('dashboard.custom.component', 'board_id', string="Components")
+    eager_card_count = fields.Integer(
+        "Eagerly Rendered Cards", default=8,
+        help="Number of cards rendered with the page; the remaining cards are "
+             "loaded when they scroll into view. 0 renders every card eagerly.")
+    card_count = fields.Integer("Cards", compute='_compute_card_count')
+
+    @api.depends('component_ids')
+    def _compute_card_count(self):
+        for board in self:
+            board.card_count = len(board.component_ids)
+
+    def _get_card_components(self, component_ids=None):
+        """Return the active cards of this board, in display order"""
+        self.ensure_one()
+        return self.env['dashboard.custom.component']._get_dashboard_cards(
+            board_id=self.id, component_ids=component_ids)
@@ -1,10 +1,67 @@
 from odoo import models, fields, api
 from odoo.tools.safe_eval import safe_eval
 import datetime
+import functools
+import hashlib
+import math
+import time
+import zlib
 from dateutil.relativedelta import relativedelta
 import logging
+import pytz
+
+from ..tools.fragment_cache import fragment_cache
+from ..tools.hyperloglog import precision_for_error
+from ..tools.metrics import CACHE_REQUESTS, CARD_COMPUTE_DURATION, CARD_ERRORS
+from ..tools.record_stream import DEFAULT_CHUNK_SIZE, RecordStream
+from ..tools.single_flight import single_flight
+from ..tools.structured_logging import configure_sampling, get_sampled_logger
 
 _logger = logging.getLogger(__name__)
+# Per-card hot path logging, sampled and lazily formatted
+_card_logger = get_sampled_logger(__name__ + '.card')
+
+# First key of the PostgreSQL advisory locks taken around card computations
+_CARD_LOCK_NAMESPACE = 0x4442
+# Seconds between two attempts at a card lock held by another worker,
+# doubled up to the maximum
+_CARD_LOCK_POLL = 0.05
+_CARD_LOCK_POLL_MAX = 0.5
+
+# Column order of the metadata rows sent by the compact refresh format
+CARD_META_FIELDS = ['name', 'subtitle', 'color', 'icon']
+
+# Length of a comparison window, per comparison period
+COMPARISON_PERIODS = {
+    'day': relativedelta(days=1),
+    'week': relativedelta(weeks=1),
+    'month': relativedelta(months=1),
+    'quarter': relativedelta(months=3),
+    'year': relativedelta(years=1),
+}
+
+# Domain evaluation context names that make the result depend on the user
+DOMAIN_USER_NAMES = {'uid', 'user'}
+
+# Domain and formula evaluation context names that make the result depend on the time
+TIME_NAMES = {'today', 'now', 'datetime', 'date', 'relativedelta', 'fields'}
+
+# Formula names that need the whole matching recordset loaded
+FORMULA_RECORDSET_NAMES = {'records', 'mapped', 'filtered'}
+
+# Card values starting with these are errors reported by _compute_card_data
+CARD_ERROR_PREFIXES = ('Error', 'Domain Error', 'Field Error', 'Formula Error', 'Model Not Found')
+
+def _code_names(expr):
+    """Global names an expression refers to, comprehensions included"""
+    names = set()
+    stack = [compile(expr, '<formula>', 'eval')]
+    while stack:
+        code = stack.pop()
+        names.update(code.co_names)
+        stack.extend(const for const in code.co_consts if isinstance(const, type(code)))
+    return names
+
 
 class DashboardComponent(models.Model):
     _name = "dashboard.custom.component"
@@ -22,6 +79,9 @@ class DashboardComponent(models.Model):
     ], string="Component Type", default='custom')
     is_active = fields.Boolean("Active", default=True)
     sequence = fields.Integer("Sequence", default=10)
+    board_id = fields.Many2one('dashboard.custom.board', string="Board", ondelete='set null', index=True,
+                               help="Board showing this component. Components without a board "
+                                    "appear on the default dashboard.")
     
     # Fields for card type
     icon = fields.Char("Icon Class", help="Font Awesome icon class (e.g., 'fa fa-users')")
@@ -48,7 +108,11 @@ class DashboardComponent(models.Model):
         ('completion_rate', 'Survey Completion Rate'),      # Added new option
         ('facilitator_performance', 'Facilitator Performance')  # Added new option
     ], string="Calculation Type", default='count')
-    formula = fields.Char("Custom Formula", help="Python expression for custom calculation")
+    formula = fields.Char("Custom Formula",
+                          help="Python expression for custom calculation. stream_sum(field), stream_avg(field), "
+                               "stream_min(field), stream_max(field), stream_count(predicate=None), "
+                               "stream_values(field) and chunks() read the records in fixed-size chunks; "
+                               "records, mapped() and filtered() load them all at once.")
     
     # iN-Clue specific fields
     facilitator_id = fields.Many2one('res.partner', string='Filter by Facilitator',
@@ -59,14 +123,483 @@ class DashboardComponent(models.Model):
         ('followup', 'Follow-ups Only')
     ], string="Session Type Filter", default='all')
     
+    # Facilitator performance: time window and approximate distinct counts
+    performance_window_days = fields.Integer("Time Window (days)", default=0,
+                                             help="Only count participations created in the last N days; "
+                                                  "0 counts all time")
+    approximate_distinct = fields.Boolean("Approximate Distinct Counts",
+                                          help="Count unique events/participants by merging per-day "
+                                               "HyperLogLog sketches (refreshed hourly) instead of scanning "
+                                               "participations. Only used without a custom domain or "
+                                               "session type filter.")
+    approximate_error = fields.Float("Approximation Error", default=0.02, digits=(16, 3),
+                                     help="Target relative standard error of approximate counts (0.02 = 2%)")
+
+    # Estimates for count/avg cards on very large tables
+    estimate_mode = fields.Boolean("Estimate",
+                                   help="Estimate count/average cards from a TABLESAMPLE SYSTEM sample "
+                                        "(or the planner row count for unfiltered counts) and show a 95% "
+                                        "confidence interval. Falls back to the exact query on small "
+                                        "tables or when the interval is too wide.")
+    estimate_sample_percent = fields.Float("Sample Size (%)", default=1.0,
+                                           help="Percentage of table pages read by the sample")
+    estimate_min_rows = fields.Integer("Minimum Table Rows", default=100000,
+                                       help="Tables with fewer rows are always counted exactly")
+    estimate_max_error = fields.Float("Maximum Relative Error", default=0.05, digits=(16, 3),
+                                      help="Relative half-width of the 95% interval above which the "
+                                           "exact query is used instead (0.05 = 5%)")
+
+    # Current vs previous window comparison
+    comparison_period = fields.Selection([
+        ('day', 'Today vs Yesterday'),
+        ('week', 'This Week vs Last Week'),
+        ('month', 'This Month vs Last Month'),
+        ('quarter', 'This Quarter vs Last Quarter'),
+        ('year', 'This Year vs Last Year'),
+    ], string="Compare",
+        help="Show the value of the current period to date with the change against the "
+             "same span of the previous period (count, sum and average cards)")
+    comparison_date_field = fields.Char("Comparison Date Field", default='create_date',
+                                        help="Stored date or datetime field placing records in a period")
+
     # User filtering
     filter_by_current_user = fields.Boolean("Filter by Current User", 
                                          help="Only show data related to the current user")
+
+    min_recompute_interval = fields.Integer(
+        "Minimum Recompute Interval (s)", default=0,
+        help="Recompute the card at most once per this many seconds across all workers; "
+             "requests in between get the last value and its age. 0 disables the limit.")
+
+    debug_logging = fields.Boolean("Debug Logging",
+                                   help="Log every computation of this card at INFO level, "
+                                        "bypassing log sampling")
     
     @api.onchange('model_id')
     def _onchange_model_id(self):
         self.count_field = False
+
+    @api.model
+    def _get_dashboard_cards(self, board_id=None, component_ids=None):
+        """Return the active cards of a board (or of the default dashboard)
+
+        :param board_id: id of a ``dashboard.custom.board``; falsy selects the
+                         cards that are not assigned to any board, unless
+                         explicit ``component_ids`` are given
+        :param component_ids: optional subset of component ids to restrict to;
+                              without a board, these may span several boards
+        """
+        domain = [
+            ('is_active', '=', True),
+            ('component_type', '=', 'card'),
+        ]
+        if board_id or component_ids is None:
+            domain.append(('board_id', '=', int(board_id) if board_id else False))
+        if component_ids is not None:
+            domain.append(('id', 'in', [int(cid) for cid in component_ids]))
+        return self.search(domain, order='sequence, id')
+
+    def _get_board_cards(self):
+        """Every active card of the boards (or default dashboard) these cards are on"""
+        domain = [('board_id', 'in', self.board_id.ids)]
+        if not all(component.board_id for component in self):
+            domain = ['|', ('board_id', '=', False)] + domain
+        return self.search([('is_active', '=', True), ('component_type', '=', 'card')] + domain,
+                           order='sequence, id')
+
+    def _get_meta_version(self):
+        """Version tag of the static card metadata (name, subtitle, color, icon)"""
+        signature = repr([(c.id, str(c.write_date)) for c in self] + [self.env.lang])
+        return hashlib.sha1(signature.encode('utf-8')).hexdigest()[:12]
+
+    def _get_card_meta(self):
+        """Static metadata of the cards, as rows matching ``CARD_META_FIELDS``"""
+        return {c.id: [c.name, c.card_subtitle or '', c.card_color, c.icon or ''] for c in self}
+
+    def _get_card_fragment_key(self, value):
+        """Cache key of the rendered card HTML for the given value"""
+        self.ensure_one()
+        value_hash = hashlib.sha1(str(value).encode('utf-8')).hexdigest()
+        return (self.env.cr.dbname, self.id, self.write_date, value_hash, self.env.lang)
+
+    def _render_card_fragments(self, values=None):
+        """Render the HTML of each card, reusing cached fragments.
+
+        :param values: optional {component_id: value} of already computed values
+        :return: {component_id: rendered card HTML}
+        """
+        values = dict(values or {})
+        missing = self.filtered(lambda c: c.id not in values)
+        if missing:
+            values.update(missing._compute_cards_shared())
+        qweb = self.env['ir.qweb']
+        fragments = {}
+        for component in self:
+            value = values[component.id]
+            key = component._get_card_fragment_key(value)
+            html = fragment_cache.get(key)
+            if html is None:
+                html = qweb._render('dashboard_custom.dashboard_card_fragment', {
+                    'component': component,
+                    'card_value': value,
+                })
+                fragment_cache.set(key, html)
+            fragments[component.id] = html
+        return fragments
+
+    def _render_card_placeholders(self):
+        """Render the lazy-loading placeholder of each card: {component_id: HTML}"""
+        qweb = self.env['ir.qweb']
+        return {
+            component.id: qweb._render('dashboard_custom.dashboard_card_placeholder', {'component': component})
+            for component in self
+        }
+
+    def _get_structured_cards(self, values=None, eager_count=0):
+        """Ordered card list used by the widget to patch the DOM in place
+
+        Cards past ``eager_count`` are only listed (``lazy``), their value is
+        not computed.
+        """
+        eager = self[:eager_count] if eager_count else self
+        values = dict(values or {})
+        missing = eager.filtered(lambda c: c.id not in values)
+        if missing:
+            values.update(missing._compute_cards_shared())
+        cards = []
+        for component in self:
+            if component not in eager:
+                cards.append({'id': component.id, 'lazy': True})
+                continue
+            cards.append({
+                'id': component.id,
+                'value': values[component.id],
+                'name': component.name,
+                'subtitle': component.card_subtitle or '',
+                'color': component.card_color,
+                'icon': component.icon or '',
+            })
+        return cards
+
+    def _render_dashboard_html(self, values=None, eager_count=0):
+        """Assemble the dashboard content from (cached) card fragments
+
+        :param eager_count: number of leading cards rendered with their value;
+                            the others become placeholders that the widget loads
+                            once they scroll into view. 0 renders every card.
+        """
+        eager = self[:eager_count] if eager_count else self
+        return self.env['ir.qweb']._render('dashboard_custom.dashboard_snippet_content', {
+            'components': self,
+            'board_id': self[:1].board_id.id,
+            'fragments': eager._render_card_fragments(values),
+            'lazy_ids': set((self - eager).ids),
+        })
     
+    def _render_dashboard_shell(self):
+        """Dashboard content rendered without computing any card
+
+        Cards shared by all users show their last stored value, the others
+        (per-user cards, cards never computed or stale) a placeholder. The output only
+        depends on the value store, so the page can be cached; the widget
+        refreshes the values and loads the placeholders once displayed.
+        """
+        shared = self.filtered(lambda c: c._get_scope_key() == 'global')
+        values = self.env['dashboard.custom.value'].sudo()._get_last_values(shared.ids)
+        known = shared.filtered(lambda c: c.id in values)
+        return self.env['ir.qweb']._render('dashboard_custom.dashboard_snippet_content', {
+            'components': self,
+            'board_id': self[:1].board_id.id,
+            'fragments': known._render_card_fragments(values),
+            'lazy_ids': set((self - known).ids),
+        })
+
+    def _get_scope_key(self):
+        """Key of the audience sharing this card's value
+
+        Values are computed with the requesting user's access, so they are
+        only shared by users who are guaranteed to get the same result:
+
+        - 'user:<uid>' when the card filters on the current user, its domain
+          refers to ``uid``/``user`` or the user cannot read the model;
+        - 'rules:<hash>' of the user's effective record rules on the models
+          the card reads, when any applies;
+        - 'global' otherwise.
+
+        Comparison windows are computed in the user's timezone: the key of
+        comparison cards ends with it, e.g. 'global:Europe/Brussels'.
+        """
+        self.ensure_one()
+        scope_key = self._get_access_scope_key()
+        if self.comparison_period:
+            scope_key = '%s:%s' % (scope_key, self.env.user.tz or 'UTC')
+        return scope_key
+
+    def _get_access_scope_key(self):
+        """Scope key of the users reading the same records, see ``_get_scope_key``"""
+        self.ensure_one()
+        user_scope = 'user:%s' % self.env.uid
+        if self.filter_by_current_user or self._domain_uses_user():
+            return user_scope
+        model_name = self._get_source_model_name()
+        if not model_name or model_name not in self.env:
+            return 'global'
+        model = self.env[model_name]
+        # Models reached through the domain's field paths apply their rules too
+        model_names = {model_name}
+        for path in self._parse_domain_paths():
+            model_names.update(name for name, __ in self._resolve_field_path(model, path))
+        IrRule = self.env['ir.rule']
+        rules = []
+        for name in sorted(model_names):
+            if not self.env[name].check_access_rights('read', raise_exception=False):
+                return user_scope
+            rule_domain = IrRule._compute_domain(name, 'read')
+            if rule_domain:
+                rules.append((name, rule_domain))
+        if not rules:
+            return 'global'
+        return 'rules:%s' % hashlib.sha1(repr(rules).encode('utf-8')).hexdigest()[:16]
+
+    def _domain_uses_user(self):
+        """Whether the card domain refers to the current user (``uid``, ``user``)"""
+        if not self.domain or self.domain == "[]":
+            return False
+        try:
+            return bool(_code_names(self.domain) & DOMAIN_USER_NAMES)
+        except SyntaxError:
+            # Unparsable domain: never shared
+            return True
+
+    def _is_time_dependent(self):
+        """Whether the card value changes with time alone, without any write:
+        comparison and time-window cards, domains and formulas using the date"""
+        self.ensure_one()
+        if self.comparison_period or self.performance_window_days:
+            return True
+        for expr in (self.domain, self.formula):
+            if not expr or expr == "[]":
+                continue
+            try:
+                if _code_names(expr) & TIME_NAMES:
+                    return True
+            except SyntaxError:
+                return True
+        return False
+
+    def _get_card_lock_key(self, scope_key):
+        """Second (signed int4) key of the advisory lock for this card and scope"""
+        self.ensure_one()
+        key = zlib.crc32(('%s:%s' % (self.id, scope_key)).encode('utf-8'))
+        return key - (1 << 32) if key >= (1 << 31) else key
+
+    def _compute_cards_shared(self, ages=None):
+        """Compute the value of each card, coalescing identical concurrent computations.
+
+        Requests for the same card and scope wait for the one already in
+        flight and share its result: threads of this process through an
+        in-memory single-flight group, other workers through a PostgreSQL
+        advisory lock and the ``dashboard.custom.value`` store. Stored values
+        no write made stale are reused for up to ``value_max_age`` seconds,
+        e.g. those of the warm-up, except for the cards depending on the
+        time (see ``_is_time_dependent``).
+
+        :param ages: optional dict filled with {component_id: age in seconds}
+                     of the values reused from the store instead of computed
+        :return: {component_id: value}
+        """
+        configure_sampling(self.env)
+        ICP = self.env['ir.config_parameter'].sudo()
+        window = int(ICP.get_param('dashboard_custom.single_flight_window', 5))
+        max_age = max(window, int(ICP.get_param('dashboard_custom.value_max_age', 300)))
+        lock_timeout = int(ICP.get_param('dashboard_custom.single_flight_lock_timeout', 10))
+        dbname = self.env.cr.dbname
+        values = {}
+        for component in self.sorted('id'):
+            scope_key = component._get_scope_key()
+            reuse_age = window if component._is_time_dependent() else max_age
+            compute = functools.partial(
+                component._compute_card_data_locked, scope_key, reuse_age, lock_timeout,
+                min_interval=component.min_recompute_interval)
+            value, age = single_flight.do((dbname, component.id, scope_key), compute)
+            values[component.id] = value
+            if ages is not None and age:
+                ages[component.id] = age
+        return values
+
+    def _acquire_card_lock(self, lock_args, lock_timeout):
+        """Take the card's advisory lock on a new cursor, polling for up to
+        ``lock_timeout`` seconds
+
+        Waiting workers hold no connection between attempts, so a burst of
+        requests for a card being computed cannot exhaust the pool.
+
+        :return: the cursor holding the lock, or None on timeout
+        """
+        deadline = time.monotonic() + lock_timeout
+        delay = _CARD_LOCK_POLL
+        while True:
+            lock_cr = self.env.registry.cursor()
+            try:
+                lock_cr.execute("SELECT pg_try_advisory_lock(%s, %s)", lock_args)
+                if lock_cr.fetchone()[0]:
+                    return lock_cr
+            except Exception:
+                lock_cr.close()
+                raise
+            lock_cr.close()
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            time.sleep(min(delay, remaining))
+            delay = min(delay * 2, _CARD_LOCK_POLL_MAX)
+
+    def _compute_card_data_locked(self, scope_key, window, lock_timeout, compute=None, min_interval=0):
+        """Compute the card under its advisory lock, unless another worker just did
+
+        The lock and the value store lookup use a dedicated cursor: its
+        transactions see values committed by other workers while we waited,
+        which the request's snapshot cannot. It is only open while the lock
+        is held.
+
+        :param compute: callable returning (value, duration in ms), the card
+                        value computation by default
+        :param min_interval: recompute at most once per this many seconds,
+                             returning the stored value in between
+        :return: (value, age in seconds of a stored value, 0 when computed)
+        """
+        self.ensure_one()
+        compute = compute or self._compute_card_data_timed
+        Value = self.env['dashboard.custom.value']
+        if min_interval:
+            with self.env.registry.cursor() as claim_cr:
+                last = Value._claim_recompute(claim_cr, self.id, scope_key, min_interval)
+            if last is not None:
+                CACHE_REQUESTS.inc(cache='value_store', result='rate_limited')
+                return last[0], float(last[1] or 0.0)
+        lock_args = (_CARD_LOCK_NAMESPACE, self._get_card_lock_key(scope_key))
+        lock_cr = self._acquire_card_lock(lock_args, lock_timeout)
+        if lock_cr is None:
+            _card_logger.warning("Timed out waiting for card lock, computing it locally",
+                                 component=self, scope=scope_key)
+            CACHE_REQUESTS.inc(cache='value_store', result='lock_timeout')
+            return compute()[0], 0.0
+
+        try:
+            # Start a new transaction so the lookup sees what the previous
+            # lock holder committed
+            lock_cr.commit()
+            recent = Value._get_recent_value(lock_cr, self.id, scope_key, window)
+            if recent is None:
+                CACHE_REQUESTS.inc(cache='value_store', result='miss')
+                # The value is computed in the current transaction's snapshot
+                self.env.cr.execute("SELECT now() at time zone 'UTC'")
+                snapshot_at = self.env.cr.fetchone()[0]
+                value, duration_ms = compute()
+                # Not stored when a write invalidated it meanwhile, still returned
+                Value._store_value(lock_cr, self.id, scope_key, value, duration_ms, snapshot_at)
+                age = 0.0
+            else:
+                CACHE_REQUESTS.inc(cache='value_store', result='hit')
+                value, age = recent[0], float(recent[1] or 0.0)
+            lock_cr.commit()
+        finally:
+            # Session lock: closing the cursor returns its connection to the
+            # pool without releasing it
+            try:
+                lock_cr.rollback()
+                lock_cr.execute("SELECT pg_advisory_unlock(%s, %s)", lock_args)
+                lock_cr.commit()
+            finally:
+                lock_cr.close()
+        return value, age
+
+    def _compute_card_data_timed(self):
+        """Compute the card and record its latency and errors; return (value, duration in ms)"""
+        self.ensure_one()
+        started = time.monotonic()
+        value = self._compute_card_data()
+        duration = time.monotonic() - started
+        CARD_COMPUTE_DURATION.observe(duration, component_id=self.id)
+        if isinstance(value, str) and value.startswith(CARD_ERROR_PREFIXES):
+            CARD_ERRORS.inc(component_id=self.id)
+        _card_logger.debug("Card computed", component=self, duration_ms=round(duration * 1000, 1))
+        return value, duration * 1000
+
+    def _prepare_card_domain(self, model, strict=False):
+        """Evaluate the card domain and add the current-user filter, if enabled
+
+        :param strict: raise on domain evaluation errors instead of falling
+                       back to an empty domain
+        """
+        self.ensure_one()
+        model_name = model._name
+
+        # Create evaluation context with date/time functions
+        eval_context = {
+            'datetime': datetime,
+            'relativedelta': relativedelta,
+            'date': datetime.date,
+            'fields': fields,
+            'today': fields.Date.today(),
+            'now': fields.Datetime.now(),
+            'uid': self.env.uid,
+            'user': self.env.user,
+        }
+
+        # For simple domains, use safe_eval with context
+        if self.domain and self.domain != "[]":
+            try:
+                domain = safe_eval(self.domain, eval_context)
+            except Exception as e:
+                if strict:
+                    raise
+                _logger.error("Domain evaluation error: %s", e)
+                domain = []
+        else:
+            domain = []
+
+        # Add user filter if enabled
+        if self.filter_by_current_user:
+            # Check the model and apply the relevant filter for the current user
+            fields_list = model.fields_get_keys()
+            if model_name == 'inclue.participation':
+                if self.env.user.partner_id.is_facilitator:
+                    # If user is a facilitator, filter by their facilitator_id
+                    domain.append(('facilitator_id', '=', self.env.user.partner_id.id))
+                    _card_logger.debug("Applied scope filter", component=self, field='facilitator_id', value=self.env.user.partner_id.id)
+                else:
+                    # If user is a participant, filter by partner_id
+                    domain.append(('partner_id', '=', self.env.user.partner_id.id))
+                    _card_logger.debug("Applied scope filter", component=self, field='partner_id', value=self.env.user.partner_id.id)
+            elif model_name == 'event.event':
+                if self.env.user.partner_id.is_facilitator:
+                    # If user is a facilitator, filter by their facilitator_id
+                    domain.append(('facilitator_id', '=', self.env.user.partner_id.id))
+                    _card_logger.debug("Applied scope filter", component=self, field='facilitator_id', value=self.env.user.partner_id.id)
+                else:
+                    # If user is not a facilitator, filter by create_uid (creator of the event)
+                    domain.append(('create_uid', '=', self.env.uid))
+                    _card_logger.debug("Applied scope filter", component=self, field='create_uid', value=self.env.uid)
+            else:
+                # For other models, apply user-specific filters based on available fields
+                if 'user_id' in fields_list:
+                    domain.append(('user_id', '=', self.env.uid))
+                    _card_logger.debug("Applied scope filter", component=self, field='user_id', value=self.env.uid)
+                elif 'facilitator_id' in fields_list:
+                    domain.append(('facilitator_id', '=', self.env.user.partner_id.id))
+                    _card_logger.debug("Applied scope filter", component=self, field='facilitator_id', value=self.env.user.partner_id.id)
+                elif 'partner_id' in fields_list:
+                    domain.append(('partner_id', '=', self.env.user.partner_id.id))
+                    _card_logger.debug("Applied scope filter", component=self, field='partner_id', value=self.env.user.partner_id.id)
+                elif 'create_uid' in fields_list:
+                    domain.append(('create_uid', '=', self.env.uid))
+                    _card_logger.debug("Applied scope filter", component=self, field='create_uid', value=self.env.uid)
+                else:
+                    _card_logger.warning("No suitable field found for user filtering", component=self, model=model_name)
+
+        return domain
+
     def _compute_card_data(self):
         """Compute the data to be displayed on the card"""
         self.ensure_one()
@@ -79,7 +612,7 @@ class DashboardComponent(models.Model):
                 elif self.calculation_type == 'facilitator_performance':
                     return self._compute_facilitator_performance()
             except Exception as e:
-                _logger.error(f"Error in dashboard calculation: {str(e)}")
+                _logger.error("Error in dashboard calculation: %s", e)
                 return f"Error: {str(e)[:20]}"
 
         if not self.model_id:
@@ -95,99 +628,57 @@ class DashboardComponent(models.Model):
 
         # Use safer domain evaluation with proper error handling
         try:
-            # Create evaluation context with date/time functions
-            eval_context = {
-                'datetime': datetime,
-                'relativedelta': relativedelta,
-                'date': datetime.date,
-                'fields': fields,
-                'today': fields.Date.today(),
-                'now': fields.Datetime.now(),
-                'uid': self.env.uid,
-                'user': self.env.user,
-            }
-
-            # For simple domains, use safe_eval with context
-            if self.domain and self.domain != "[]":
-                try:
-                    domain = safe_eval(self.domain, eval_context)
-                except Exception as e:
-                    _logger.error(f"Domain evaluation error: {str(e)}")
-                    domain = []
-            else:
-                domain = []
-
-            # Add user filter if enabled
-            if self.filter_by_current_user:
-                # Check the model and apply the relevant filter for the current user
-                fields_list = model.fields_get_keys()
-                if model_name == 'inclue.participation':
-                    if self.env.user.partner_id.is_facilitator:
-                        # If user is a facilitator, filter by their facilitator_id
-                        domain.append(('facilitator_id', '=', self.env.user.partner_id.id))
-                        _logger.info(f"Applied facilitator filter: {self.env.user.partner_id.id}")
-                    else:
-                        # If user is a participant, filter by partner_id
-                        domain.append(('partner_id', '=', self.env.user.partner_id.id))
-                        _logger.info(f"Applied participant filter: {self.env.user.partner_id.id}")
-                elif model_name == 'event.event':
-                    if self.env.user.partner_id.is_facilitator:
-                        # If user is a facilitator, filter by their facilitator_id
-                        domain.append(('facilitator_id', '=', self.env.user.partner_id.id))
-                        _logger.info(f"Applied event facilitator filter: {self.env.user.partner_id.id}")
-                    else:
-                        # If user is not a facilitator, filter by create_uid (creator of the event)
-                        domain.append(('create_uid', '=', self.env.uid))
-                        _logger.info(f"Applied event creator filter: {self.env.uid}")
-                else:
-                    # For other models, apply user-specific filters based on available fields
-                    if 'user_id' in fields_list:
-                        domain.append(('user_id', '=', self.env.uid))
-                        _logger.info(f"Applied user_id filter: {self.env.uid}")
-                    elif 'facilitator_id' in fields_list:
-                        domain.append(('facilitator_id', '=', self.env.user.partner_id.id))
-                        _logger.info(f"Applied facilitator_id filter: {self.env.user.partner_id.id}")
-                    elif 'partner_id' in fields_list:
-                        domain.append(('partner_id', '=', self.env.user.partner_id.id))
-                        _logger.info(f"Applied partner_id filter: {self.env.user.partner_id.id}")
-                    elif 'create_uid' in fields_list:
-                        domain.append(('create_uid', '=', self.env.uid))
-                        _logger.info(f"Applied create_uid filter: {self.env.uid}")
-                    else:
-                        _logger.warning(f"No suitable field found for user filtering in model {model_name}")
-
+            domain = self._prepare_card_domain(model)
         except Exception as e:
-            _logger.error(f"Domain preparation error: {str(e)}")
+            _logger.error("Domain preparation error: %s", e)
             return f"Domain Error: {str(e)[:20]}"
         
+        # Current and previous windows in a single aggregate query
+        if self.comparison_period:
+            try:
+                with self.env.cr.savepoint():
+                    return self._compute_comparison(model, domain)
+            except Exception as e:
+                _logger.error("Comparison error: %s", e)
+                return f"Error: {str(e)[:20]}"
+
+        # Cheap estimate first, when enabled and precise enough
+        if self.estimate_mode and self.calculation_type in ('count', 'avg'):
+            try:
+                with self.env.cr.savepoint():
+                    estimate = self._compute_estimate(model, domain)
+                if estimate is not None:
+                    return estimate
+            except Exception as e:
+                _logger.error("Estimate error, using exact query: %s", e)
+
         # Now perform the actual calculation using the domain
         try:
             if self.calculation_type == 'count':
                 return str(model.search_count(domain))
             elif self.calculation_type in ['sum', 'avg'] and self.count_field:
-                records = model.search(domain)
-                if not records:
-                    return "0"
-                
                 # Safely get field values
                 try:
-                    values = records.mapped(self.count_field)
-                    if not values:
+                    total, count = self._compute_sum_count(model, domain)
+                    if not count:
                         return "0"
                     
                     if self.calculation_type == 'sum':
-                        total = sum(values)
                         return str(total)
                     else:  # avg
-                        avg = sum(values) / len(values) if values else 0
+                        avg = total / count
                         return str(round(avg, 1))
                 except Exception as e:
-                    _logger.error(f"Field mapping error: {str(e)}")
+                    _logger.error("Field mapping error: %s", e)
                     return f"Field Error: {str(e)[:20]}"
                 
             elif self.calculation_type == 'formula' and self.formula:
-                records = model.search(domain)
-                if not records:
+                stream = self._get_record_stream(model, domain)
+                # The whole recordset is only loaded for formulas using it;
+                # the stream_* reductions read the records chunk by chunk
+                uses_records = bool(_code_names(self.formula) & FORMULA_RECORDSET_NAMES)
+                records = model.search(domain) if uses_records else model
+                if uses_records and not records:
                     return "0"
                 
                 # Use safer formula evaluation
@@ -204,20 +695,221 @@ class DashboardComponent(models.Model):
                         'filtered': lambda func: records.filtered(func),
                         'datetime': datetime,
                         'relativedelta': relativedelta,
+                        'chunks': stream.chunks,
+                        'stream_values': stream.values,
+                        'stream_count': stream.count,
+                        'stream_sum': stream.sum,
+                        'stream_avg': stream.avg,
+                        'stream_min': stream.min,
+                        'stream_max': stream.max,
                     }
                     
                     result = safe_eval(self.formula, global_vars)
                     return str(result)
                 except Exception as e:
-                    _logger.error(f"Formula evaluation error: {str(e)}")
+                    _logger.error("Formula evaluation error: %s", e)
                     return f"Formula Error: {str(e)[:20]}"
             
             return self.card_value or "0"
         except Exception as e:
-            _logger.error(f"Card computation error: {str(e)}")
+            _logger.error("Card computation error: %s", e)
             return f"Error: {str(e)[:20]}"
 
     
+    def _get_record_stream(self, model, domain):
+        chunk_size = self.env['ir.config_parameter'].sudo().get_param('dashboard_custom.chunk_size')
+        return RecordStream(model, domain, chunk_size or DEFAULT_CHUNK_SIZE)
+
+    def _compute_sum_count(self, model, domain):
+        """Sum of the card's count field over the matching records, and their number
+
+        Stored numeric fields are aggregated by the database; related paths
+        and computed fields are read in chunks, so the records are never all
+        loaded at once. Empty values count as 0.
+        """
+        self.ensure_one()
+        field = model._fields.get(self.count_field)
+        if field and field.store and field.column_type and field.type in ('integer', 'float', 'monetary'):
+            groups = model.read_group(domain, ['%s:sum' % field.name], [], lazy=False)
+            if not groups:
+                return 0, 0
+            return groups[0][field.name] or 0, groups[0]['__count']
+        total = count = 0
+        for value in self._get_record_stream(model, domain).values(self.count_field):
+            total += value or 0
+            count += 1
+        return total, count
+
+    def _compute_estimate(self, model, domain):
+        """Estimate a count/avg card value with its 95% confidence interval
+
+        TABLESAMPLE SYSTEM reads whole pages, so the sample is a cluster
+        sample: the variance is estimated across the sampled pages, not
+        across rows.
+
+        :return: the formatted estimate, or None when the exact query should
+                 be used instead (small table, unsupported field or query,
+                 interval too wide)
+        """
+        self.ensure_one()
+        cr = self.env.cr
+        cr.execute("""
+            SELECT c.reltuples, s.n_mod_since_analyze
+              FROM pg_class c LEFT JOIN pg_stat_user_tables s ON s.relid = c.oid
+             WHERE c.oid = %s::regclass
+        """, (model._table,))
+        row = cr.fetchone()
+        if not row or row[0] < (self.estimate_min_rows or 0):
+            return None
+        reltuples, modified = row
+        max_error = self.estimate_max_error or 0.0
+
+        column = None
+        if self.calculation_type == 'avg':
+            field = model._fields.get(self.count_field or '')
+            if not field or not field.store or field.type not in ('integer', 'float', 'monetary'):
+                return None
+            column = '"%s"."%s"' % (model._table, field.name)
+
+        model.flush_model()
+        query = model._where_calc(domain)
+        model._apply_ir_rules(query, 'read')
+        from_clause, where_clause, params = query.get_sql()
+
+        # No filter at all: the planner statistics, off by at most the rows
+        # modified since they were gathered
+        if column is None and not where_clause and modified is not None and reltuples:
+            relative_error = modified / reltuples
+            if relative_error <= max_error:
+                return "≈%s ±%s%%" % (int(reltuples), round(relative_error * 100, 1))
+
+        # The filter is evaluated per sampled row, without joins
+        main_table = '"%s"' % model._table
+        if from_clause != main_table:
+            return None
+        fraction = min(max(self.estimate_sample_percent or 1.0, 0.01), 100.0) / 100.0
+        matches = "FILTER (WHERE %s)" % where_clause if where_clause else ""
+        page_sum, page_params = "0::float", []
+        if column:
+            page_sum, page_params = "coalesce(sum(coalesce(%s, 0)) %s, 0)::float" % (column, matches), params
+        cr.execute("""
+            SELECT count(*), sum(n)::float, sum(n * n)::float, sum(s), sum(s * s), sum(n * s)
+              FROM (SELECT count(*) %s AS n, %s AS s
+                      FROM %s TABLESAMPLE SYSTEM (%%s)
+                     GROUP BY (ctid::text::point)[0]) pages
+        """ % (matches, page_sum, main_table), params + page_params + [fraction * 100])
+        pages, sum_n, sum_nn, sum_s, sum_ss, sum_ns = cr.fetchone()
+        if pages < 2 or not sum_n:
+            return None
+
+        # Per-page totals n (matching rows) and s (sum of the column)
+        if column is None:
+            value = sum_n / fraction
+            variance = (sum_nn - sum_n * sum_n / pages) / (pages - 1)
+            half_width = 1.96 * math.sqrt(max(variance, 0.0) * pages * (1 - fraction)) / fraction
+        else:
+            # Ratio estimator of the average over the sampled pages
+            value = sum_s / sum_n
+            residuals = (sum_ss - 2 * value * sum_ns + value * value * sum_nn) / (pages - 1)
+            mean_n = sum_n / pages
+            half_width = 1.96 * math.sqrt(max(residuals, 0.0) * (1 - fraction) / pages) / mean_n
+
+        if value:
+            relative_error = abs(half_width / value)
+        else:
+            relative_error = 0.0 if not half_width else float('inf')
+        if relative_error > max_error:
+            return None
+
+        shown = int(round(value)) if column is None else round(value, 1)
+        return "≈%s ±%s%%" % (shown, round(relative_error * 100, 1))
+
+    def _get_comparison_windows(self, date_field, now=None):
+        """Bounds of the current period to date and of the same span of the
+        previous period, in the user's timezone
+
+        :return: (previous start, previous end, current start, current end),
+                 dates for date fields, naive UTC datetimes otherwise
+        """
+        self.ensure_one()
+        tz = pytz.timezone(self.env.user.tz or 'UTC')
+        now = pytz.utc.localize(now or fields.Datetime.now()).astimezone(tz).replace(tzinfo=None)
+        today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        if self.comparison_period == 'week':
+            current_start = today - relativedelta(days=today.weekday())
+        elif self.comparison_period == 'month':
+            current_start = today.replace(day=1)
+        elif self.comparison_period == 'quarter':
+            current_start = today.replace(month=(today.month - 1) // 3 * 3 + 1, day=1)
+        elif self.comparison_period == 'year':
+            current_start = today.replace(month=1, day=1)
+        else:
+            current_start = today
+        # Date fields are compared by whole days, today included
+        current_end = today + relativedelta(days=1) if date_field.type == 'date' else now
+
+        previous_start = current_start - COMPARISON_PERIODS[self.comparison_period]
+        # Shorter previous months are capped at their own end
+        previous_end = min(previous_start + (current_end - current_start), current_start)
+
+        bounds = (previous_start, previous_end, current_start, current_end)
+        if date_field.type == 'date':
+            return tuple(bound.date() for bound in bounds)
+        return tuple(tz.localize(bound).astimezone(pytz.utc).replace(tzinfo=None) for bound in bounds)
+
+    def _get_comparison_domain(self, date_field):
+        """Domain of the union of the previous and current comparison windows"""
+        previous_start, __, __, current_end = self._get_comparison_windows(date_field)
+        return [(date_field.name, '>=', previous_start), (date_field.name, '<', current_end)]
+
+    def _compute_comparison(self, model, domain):
+        """Current period value with its change against the previous period
+
+        Both windows are aggregated by one query, with FILTER clauses on the
+        comparison date field over the union of the two windows.
+
+        :return: e.g. "120 ▲ 12.5%"
+        """
+        self.ensure_one()
+        date_field = model._fields.get(self.comparison_date_field or '')
+        if not date_field or not date_field.store or date_field.type not in ('date', 'datetime'):
+            raise ValueError("%s is not a stored date field" % self.comparison_date_field)
+
+        aggregate = "count(*)"
+        if self.calculation_type in ('sum', 'avg'):
+            field = model._fields.get(self.count_field or '')
+            if not field or not field.store or field.type not in ('integer', 'float', 'monetary'):
+                raise ValueError("%s is not a stored numeric field" % self.count_field)
+            aggregate = '%s(coalesce("%s"."%s", 0))' % (self.calculation_type, model._table, field.name)
+        elif self.calculation_type != 'count':
+            raise ValueError("comparison needs a count, sum or average card")
+
+        previous_start, previous_end, current_start, current_end = self._get_comparison_windows(date_field)
+        model.flush_model()
+        query = model._where_calc(list(domain) + self._get_comparison_domain(date_field))
+        model._apply_ir_rules(query, 'read')
+        from_clause, where_clause, params = query.get_sql()
+        column = '"%s"."%s"' % (model._table, date_field.name)
+        window = "%s FILTER (WHERE %s >= %%s AND %s < %%s)" % (aggregate, column, column)
+        self.env.cr.execute(
+            "SELECT %s, %s FROM %s WHERE %s" % (window, window, from_clause, where_clause),
+            [current_start, current_end, previous_start, previous_end] + params,
+        )
+        current, previous = (float(value or 0) for value in self.env.cr.fetchone())
+
+        if self.calculation_type == 'count':
+            shown = int(current)
+        elif self.calculation_type == 'avg':
+            shown = round(current, 1)
+        else:
+            shown = int(current) if current.is_integer() else round(current, 2)
+
+        if not previous:
+            return "%s ▲" % shown if current > 0 else "%s ▬" % shown
+        delta = (current - previous) / abs(previous) * 100
+        arrow = '▲' if delta > 0 else '▼' if delta < 0 else '▬'
+        return "%s %s %s%%" % (shown, arrow, round(abs(delta), 1))
+
     # def _compute_completion_rate(self):
     #     """Calculate survey completion rate"""
     #     domain = []
@@ -300,7 +992,7 @@ class DashboardComponent(models.Model):
                 }
                 domain = safe_eval(self.domain, eval_context)
             except Exception as e:
-                _logger.error(f"Domain evaluation error in completion rate: {str(e)}")
+                _logger.error("Domain evaluation error in completion rate: %s", e)
                 # Continue with empty domain rather than failing
         
         # Apply facilitator filter if specified
@@ -327,7 +1019,7 @@ class DashboardComponent(models.Model):
                 
             participations = self.env['inclue.participation'].search(domain)
         except Exception as e:
-            _logger.error(f"Search error in completion rate: {str(e)}")
+            _logger.error("Search error in completion rate: %s", e)
             return "Error"
         
         if not participations:
@@ -428,16 +1120,31 @@ class DashboardComponent(models.Model):
                 }
                 domain = safe_eval(self.domain, eval_context)
             except Exception as e:
-                _logger.error(f"Domain evaluation error in facilitator performance: {str(e)}")
+                _logger.error("Domain evaluation error in facilitator performance: %s", e)
                 # Continue with empty domain rather than failing
         
         # Apply facilitator filter if specified
+        facilitator = self.env['res.partner']
         if self.facilitator_id:
-            domain.append(('facilitator_id', '=', self.facilitator_id.id))
+            facilitator = self.facilitator_id
         elif self.filter_by_current_user and self.env.user.partner_id.is_facilitator:
             # If filter by current user is enabled and user is a facilitator
-            domain.append(('facilitator_id', '=', self.env.user.partner_id.id))
-        
+            facilitator = self.env.user.partner_id
+        if facilitator:
+            domain.append(('facilitator_id', '=', facilitator.id))
+
+        # Distinct counts from merged sketches, when nothing else narrows the
+        # scan: sketches are built from every participation, so not when
+        # record rules restrict the ones the user sees
+        if (self.approximate_distinct and (self.count_field or 'events') in ('events', 'participants')
+                and not (self.domain and self.domain != "[]") and self.session_type in (False, 'all')
+                and self._sees_all_participations()):
+            return self._compute_approximate_distinct(facilitator)
+
+        if self.performance_window_days:
+            # Whole UTC days, the granularity of the sketches
+            domain.append(('create_date', '>=', fields.Datetime.to_datetime(self._get_performance_window_start())))
+
         # Get the participation records
         try:
             # Check if model exists
@@ -446,7 +1153,7 @@ class DashboardComponent(models.Model):
                 
             participations = self.env['inclue.participation'].search(domain)
         except Exception as e:
-            _logger.error(f"Search error in facilitator performance: {str(e)}")
+            _logger.error("Search error in facilitator performance: %s", e)
             return "Error"
         
         if not participations:
@@ -472,4 +1179,34 @@ class DashboardComponent(models.Model):
             return f"{round(completion_rate)}%"
         else:
             # Default to events count if no field specified
-            return str(len(events))
\ No newline at end of file
+            return str(len(events))
+
+    def _get_performance_window_start(self):
+        """First UTC day of the performance window"""
+        return fields.Datetime.now().date() - relativedelta(days=self.performance_window_days)
+
+    def _sees_all_participations(self):
+        """Whether the user reads participations without any record rule applying"""
+        if 'inclue.participation' not in self.env:
+            return False
+        Participation = self.env['inclue.participation']
+        return (Participation.check_access_rights('read', raise_exception=False)
+                and not self.env['ir.rule']._compute_domain(Participation._name, 'read'))
+
+    def _compute_approximate_distinct(self, facilitator):
+        """Approximate unique events/participants of a facilitator (or of all of them)
+
+        The sketches are read as superuser: only for users who can read
+        every participation, see ``_sees_all_participations``.
+        """
+        self.ensure_one()
+        date_from = None
+        if self.performance_window_days:
+            date_from = self._get_performance_window_start()
+        count = self.env['dashboard.custom.hll.sketch'].sudo()._estimate_distinct(
+            self.count_field or 'events',
+            facilitator_ids=facilitator.ids,
+            date_from=date_from,
+            precision=precision_for_error(self.approximate_error),
+        )
+        return str(count)
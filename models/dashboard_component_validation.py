@@ -0,0 +1,266 @@
+import json
+import logging
+
+from odoo import models, fields, api, _
+from odoo.exceptions import ValidationError
+from odoo.tools.safe_eval import test_python_expr
+
+from .dashboard_component import FORMULA_RECORDSET_NAMES, _code_names
+
+_logger = logging.getLogger(__name__)
+
+# Numeric field types that can be summed/averaged
+NUMERIC_FIELD_TYPES = ('integer', 'float', 'monetary')
+
+# count_field values understood by the facilitator performance calculation
+PERFORMANCE_METRICS = ('events', 'participants', 'completion_rate')
+
+# Calculations that read all the matching participations
+RECORD_LOADING_CALCULATIONS = ('completion_rate', 'facilitator_performance')
+
+# Component fields whose change requires validating active cards again
+VALIDATED_FIELDS = {
+    'is_active', 'component_type', 'model_id', 'domain', 'calculation_type', 'count_field', 'formula',
+    'filter_by_current_user', 'comparison_period', 'comparison_date_field', 'estimate_mode',
+}
+
+
+class DashboardComponent(models.Model):
+    _inherit = "dashboard.custom.component"
+
+    validation_state = fields.Selection([
+        ('not_checked', 'Not Checked'),
+        ('valid', 'Valid'),
+        ('invalid', 'Invalid'),
+        ('expensive', 'Too Expensive'),
+    ], string="Validation", default='not_checked', readonly=True, copy=False)
+    validation_message = fields.Text("Validation Details", readonly=True, copy=False)
+    estimated_cost = fields.Float("Estimated Query Cost", readonly=True, copy=False,
+                                  help="PostgreSQL planner cost of the card's query")
+    estimated_rows = fields.Float("Estimated Rows", readonly=True, copy=False,
+                                  help="Rows the planner expects the card's query to return")
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        components = super().create(vals_list)
+        if not self.env.context.get('skip_card_validation'):
+            components._check_card_configuration()
+        return components
+
+    def write(self, vals):
+        result = super().write(vals)
+        if VALIDATED_FIELDS.intersection(vals) and not self.env.context.get('skip_card_validation'):
+            self._check_card_configuration()
+        return result
+
+    def _check_card_configuration(self):
+        """Refuse to activate cards that would fail or be too expensive at view time"""
+        cards = self.filtered(lambda c: c.is_active and c.component_type == 'card')
+        results = cards._validate_configuration()
+        cards._store_validation_results(results)
+        refused = [(card, result) for card, result in zip(cards, results) if result['state'] != 'valid']
+        if refused:
+            raise ValidationError(_("These dashboard cards cannot be activated:\n%s") % "\n".join(
+                "- %s: %s" % (card.name, result['message']) for card, result in refused))
+
+    def action_validate_configuration(self):
+        """Validate the selected cards; deactivate the active ones that fail"""
+        results = self._validate_configuration()
+        self._store_validation_results(results)
+        failing = self.browse([card.id for card, result in zip(self, results) if result['state'] != 'valid'])
+        deactivated = failing.filtered('is_active')
+        if deactivated:
+            # Bypass the activation check, these are being switched off
+            deactivated.with_context(skip_card_validation=True).write({'is_active': False})
+
+        message = _("%(valid)s valid, %(failing)s failing (%(deactivated)s deactivated).") % {
+            'valid': len(self) - len(failing),
+            'failing': len(failing),
+            'deactivated': len(deactivated),
+        }
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': _("Dashboard Card Validation"),
+                'message': message,
+                'type': 'warning' if failing else 'success',
+                'sticky': bool(failing),
+                'next': {'type': 'ir.actions.act_window_close'},
+            },
+        }
+
+    def _store_validation_results(self, results):
+        for card, result in zip(self, results):
+            card.with_context(skip_card_validation=True).write({
+                'validation_state': result['state'],
+                'validation_message': result['message'],
+                'estimated_cost': result['cost'],
+                'estimated_rows': result['rows'],
+            })
+
+    def _get_validation_thresholds(self):
+        ICP = self.env['ir.config_parameter'].sudo()
+        return (
+            float(ICP.get_param('dashboard_custom.max_card_cost', 1000000)),
+            float(ICP.get_param('dashboard_custom.max_card_rows', 100000)),
+        )
+
+    def _validate_configuration(self):
+        """Compile and dry-run every card of ``self``
+
+        Checks the model, the domain (evaluation and field existence), the
+        count field against ``ir.model.fields`` and the formula syntax, then
+        runs EXPLAIN on the card query to estimate its cost.
+
+        :return: one dict per card, in order, with keys ``state``
+                 ('valid', 'invalid' or 'expensive'), ``message``, ``cost``
+                 and ``rows``
+        """
+        max_cost, max_rows = self._get_validation_thresholds()
+        results = []
+        for card in self:
+            errors = []
+            cost = rows = 0.0
+            try:
+                with self.env.cr.savepoint():
+                    errors, cost, rows = card._validate_card()
+            except Exception as e:
+                errors = [_("Dry run failed: %s") % e]
+
+            if errors:
+                state, message = 'invalid', "\n".join(errors)
+            elif cost > max_cost and not card._is_estimated():
+                state = 'expensive'
+                message = _("Estimated cost %(cost)s exceeds the limit of %(limit)s.") % {
+                    'cost': round(cost), 'limit': round(max_cost)}
+            elif rows > max_rows and card._loads_all_records():
+                state = 'expensive'
+                message = _("Loads about %(rows)s records, more than the limit of %(limit)s.") % {
+                    'rows': round(rows), 'limit': round(max_rows)}
+            else:
+                state, message = 'valid', False
+            results.append({'state': state, 'message': message, 'cost': cost, 'rows': rows})
+        return results
+
+    def _loads_all_records(self):
+        """Whether computing the card reads every matching record, rather
+        than aggregating in SQL (estimates, comparisons, stored field sums)"""
+        self.ensure_one()
+        if self.comparison_period or self._is_estimated():
+            return False
+        if self.calculation_type in RECORD_LOADING_CALCULATIONS:
+            return True
+        if self.calculation_type in ('sum', 'avg'):
+            model_name = self._get_source_model_name()
+            field = model_name in self.env and self.env[model_name]._fields.get(self.count_field or '')
+            return not (field and field.store and field.column_type and field.type in NUMERIC_FIELD_TYPES)
+        if self.calculation_type == 'formula' and self.formula:
+            try:
+                return bool(_code_names(self.formula) & FORMULA_RECORDSET_NAMES)
+            except SyntaxError:
+                return True
+        return False
+
+    def _is_estimated(self):
+        """Whether the card is computed from a table sample, whose cost does
+        not grow with the query's: the estimate falls back to the exact query
+        only when the sample is too small to be accurate"""
+        self.ensure_one()
+        return self.estimate_mode and self.calculation_type in ('count', 'avg') and not self.comparison_period
+
+    def _get_source_model_name(self):
+        """Model the card's records are read from"""
+        self.ensure_one()
+        if self.calculation_type in ('completion_rate', 'facilitator_performance'):
+            return 'inclue.participation'
+        return self.model_id.model
+
+    def _validate_card(self):
+        """Validate one card; return (errors, estimated cost, estimated rows)"""
+        self.ensure_one()
+        model_name = self._get_source_model_name()
+        if not model_name:
+            # Static card showing card_value
+            return [], 0.0, 0.0
+        if model_name not in self.env:
+            return [_("Model %s not found.") % model_name], 0.0, 0.0
+        model = self.env[model_name]
+
+        errors = []
+        try:
+            domain = self._prepare_card_domain(model, strict=True)
+            if not isinstance(domain, list):
+                raise ValueError(_("the domain must evaluate to a list"))
+            query = model._where_calc(domain)
+            model._apply_ir_rules(query, 'read')
+        except Exception as e:
+            return [_("Domain: %s") % e], 0.0, 0.0
+
+        if self.calculation_type in ('sum', 'avg'):
+            errors += self._validate_numeric_field_path(model_name)
+        elif self.calculation_type == 'facilitator_performance':
+            if self.count_field and self.count_field not in PERFORMANCE_METRICS:
+                errors.append(_("Count field must be one of %s.") % ", ".join(PERFORMANCE_METRICS))
+        elif self.calculation_type == 'formula':
+            if not self.formula:
+                errors.append(_("Formula is required."))
+            else:
+                error = test_python_expr(self.formula, mode='eval')
+                if error:
+                    errors.append(_("Formula: %s") % error)
+        if self.comparison_period:
+            errors += self._validate_comparison(model)
+        if errors:
+            return errors, 0.0, 0.0
+
+        if self.comparison_period:
+            # Only the two comparison windows are read
+            query = model._where_calc(domain + self._get_comparison_domain(model._fields[self.comparison_date_field]))
+            model._apply_ir_rules(query, 'read')
+        cost, rows = self._explain_query(model, query)
+        return [], cost, rows
+
+    def _validate_numeric_field_path(self, model_name):
+        """Check that count_field is a (possibly dotted) path to a numeric field"""
+        if not self.count_field:
+            return [_("Count field is required for sum/average cards.")]
+        IrModelFields = self.env['ir.model.fields']
+        field = None
+        for name in self.count_field.split('.'):
+            if field is not None:
+                if not field.relation:
+                    return [_("Field %s is not relational.") % field.name]
+                model_name = field.relation
+            field = IrModelFields._get(model_name, name)
+            if not field:
+                return [_("Field %(field)s does not exist on %(model)s.") % {'field': name, 'model': model_name}]
+        if field.ttype not in NUMERIC_FIELD_TYPES:
+            return [_("Field %(field)s is a %(type)s field, not a numeric one.") % {
+                'field': self.count_field, 'type': field.ttype}]
+        return []
+
+    def _validate_comparison(self, model):
+        """Check that the comparison runs as a single aggregate on stored columns"""
+        if self.calculation_type not in ('count', 'sum', 'avg'):
+            return [_("Comparison is only available for count, sum and average cards.")]
+        errors = []
+        date_field = model._fields.get(self.comparison_date_field or '')
+        if not date_field or not date_field.store or date_field.type not in ('date', 'datetime'):
+            errors.append(_("Comparison date field must be a stored date or datetime field of %s.") % model._name)
+        if self.calculation_type in ('sum', 'avg'):
+            field = model._fields.get(self.count_field or '')
+            if not field or not field.store or field.type not in NUMERIC_FIELD_TYPES:
+                errors.append(_("Comparison needs a stored numeric field of %s, not a related path.") % model._name)
+        return errors
+
+    def _explain_query(self, model, query):
+        """EXPLAIN (without executing) the card query; return (total cost, plan rows)"""
+        model.flush_model()
+        sql, params = query.select('"%s"."id"' % model._table)
+        self.env.cr.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+        plan = self.env.cr.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        root = plan[0]['Plan']
+        return root.get('Total Cost', 0.0), root.get('Plan Rows', 0.0)
@@ -0,0 +1,333 @@
+import ast
+import functools
+import logging
+import re
+
+from psycopg2.errors import SerializationFailure
+
+from odoo import models, fields, api
+
+_logger = logging.getLogger(__name__)
+
+# Fields read by the built-in calculations, on their source model
+CALCULATION_DEPENDENCIES = {
+    'completion_rate': ('completed', 'facilitator_id', 'session_type'),
+    'facilitator_performance': ('completed', 'facilitator_id', 'session_type', 'event_id', 'partner_id',
+                                'create_date'),
+}
+
+# Fields the "Filter by Current User" option may filter on
+USER_FILTER_FIELDS = ('facilitator_id', 'partner_id', 'user_id', 'create_uid')
+
+# Component fields whose change requires rebuilding its dependencies
+DEPENDENCY_SOURCE_FIELDS = {
+    'model_id', 'domain', 'count_field', 'formula', 'calculation_type', 'filter_by_current_user',
+    'comparison_period', 'comparison_date_field', 'drilldown_groupby',
+}
+
+# Component fields whose change makes the card's stored values stale
+VALUE_SOURCE_FIELDS = DEPENDENCY_SOURCE_FIELDS | {
+    'facilitator_id', 'session_type', 'performance_window_days', 'approximate_distinct', 'approximate_error',
+    'estimate_mode', 'estimate_sample_percent', 'estimate_min_rows', 'estimate_max_error', 'drilldown_limit',
+}
+
+# Models whose writes never make a card stale
+UNTRACKED_MODELS = {'dashboard.custom.dependency', 'dashboard.custom.value'}
+
+_FIELD_PATH = re.compile(r'^[a-z_][a-z0-9_]*(\.[a-z_][a-z0-9_]*)*(:[a-z]+)?$')
+
+# Post-commit data key of the components to mark stale
+_STALE_KEY = 'dashboard_custom.stale_component_ids'
+
+# Attempts at marking values stale when concurrent stores conflict with it
+_STALE_ATTEMPTS = 5
+
+# Per process and database: (index version, {model: (all card ids, {field: card ids})})
+_index_cache = {}
+
+
+class DashboardDependency(models.Model):
+    """Index of the model fields each card reads, built by parsing its configuration.
+
+    A card depends on ``(model, field_name)`` when a write to that field can
+    change its value; creating or deleting records of any model it depends
+    on makes it stale too.
+    """
+    _name = "dashboard.custom.dependency"
+    _description = "Dashboard Card Dependency"
+    _log_access = False
+    _order = "model, field_name"
+
+    component_id = fields.Many2one('dashboard.custom.component', string="Component",
+                                   required=True, ondelete='cascade', index=True)
+    model = fields.Char("Model", required=True, index=True)
+    field_name = fields.Char("Field", required=True)
+
+    _sql_constraints = [
+        ('component_model_field_uniq', 'unique(component_id, model, field_name)',
+         "A card dependency is only recorded once."),
+    ]
+
+    def init(self):
+        # Index the cards that existed before this model did
+        self.env.cr.execute("SELECT 1 FROM dashboard_custom_dependency LIMIT 1")
+        if not self.env.cr.fetchone():
+            self.env['dashboard.custom.component'].with_context(active_test=False).search([])._rebuild_dependencies()
+
+    def _register_hook(self):
+        """Hook the writes of the models cards depend on, and only those"""
+        super()._register_hook()
+
+        def make_create():
+            @api.model
+            def _create(self, data_list):
+                records = _create.origin(self, data_list)
+                if self.pool.ready:
+                    Dependency = self.env['dashboard.custom.dependency']
+                    Dependency._mark_stale_after_commit(Dependency._get_stale_components(self._name))
+                return records
+            return _create
+
+        def make_write():
+            def _write(self, vals):
+                # Also reached by the recomputation of stored computed fields
+                result = _write.origin(self, vals)
+                if self and self.pool.ready:
+                    Dependency = self.env['dashboard.custom.dependency']
+                    Dependency._mark_stale_after_commit(Dependency._get_stale_components(self._name, vals))
+                return result
+            return _write
+
+        def make_unlink():
+            def unlink(self):
+                stale = set()
+                if self and self.pool.ready:
+                    stale = self.env['dashboard.custom.dependency']._get_stale_components(self._name)
+                result = unlink.origin(self)
+                self.env['dashboard.custom.dependency']._mark_stale_after_commit(stale)
+                return result
+            return unlink
+
+        for model_name in self._get_indexed_models():
+            Model = type(self.env[model_name])
+            for name, make in (('_create', make_create), ('_write', make_write), ('unlink', make_unlink)):
+                origin = getattr(Model, name)
+                method = make()
+                wrapped = api.propagate(origin, method)
+                wrapped.origin = method.origin = origin
+                wrapped._dashboard_stale_hook = True
+                setattr(Model, name, wrapped)
+
+    def _unregister_hook(self):
+        for Model in self.env.registry.values():
+            for name in ('_create', '_write', 'unlink'):
+                if getattr(Model.__dict__.get(name), '_dashboard_stale_hook', False):
+                    delattr(Model, name)
+        super()._unregister_hook()
+
+    def _get_indexed_models(self):
+        """Models of the registry that some card depends on"""
+        self.env.cr.execute("SELECT DISTINCT model FROM dashboard_custom_dependency")
+        return sorted(
+            name for name, in self.env.cr.fetchall()
+            if name in self.env and name not in UNTRACKED_MODELS
+            and not self.env[name]._abstract and not self.env[name]._transient
+        )
+
+    def _index_changed(self, models_before):
+        """Hook the models a rebuilt index added; the other workers reload
+        their registry to do the same"""
+        if set(self._get_indexed_models()) - set(models_before) and self.env.registry.ready:
+            self._unregister_hook()
+            self._register_hook()
+            self.env.registry.registry_invalidated = True
+
+    @api.model
+    def _get_dependents(self, model_name):
+        """Cards depending on a model: None, or (all card ids, {field: card ids})
+
+        The index is kept in memory per process. Rebuilds replace rows with
+        new ids, so (max id, row count) read in the current snapshot tells
+        whether the in-memory copy is still that index.
+        """
+        self.env.cr.execute("SELECT max(id), count(*) FROM dashboard_custom_dependency")
+        version = self.env.cr.fetchone()
+        cached = _index_cache.get(self.env.cr.dbname)
+        if cached is None or cached[0] != version:
+            self.env.cr.execute("""
+                SELECT model, field_name, array_agg(component_id) FROM dashboard_custom_dependency
+                 GROUP BY model, field_name
+            """)
+            by_model = {}
+            for name, field_name, ids in self.env.cr.fetchall():
+                by_model.setdefault(name, {})[field_name] = frozenset(ids)
+            index = {
+                name: (frozenset().union(*by_field.values()), by_field)
+                for name, by_field in by_model.items()
+            }
+            cached = _index_cache[self.env.cr.dbname] = (version, index)
+        return cached[1].get(model_name)
+
+    @api.model
+    def _get_stale_components(self, model_name, field_names=None):
+        """Ids of the cards a write to ``field_names`` of ``model_name`` affects;
+        all the cards reading the model when ``field_names`` is None (records
+        created or deleted)"""
+        dependents = self._get_dependents(model_name)
+        if dependents is None:
+            return set()
+        all_ids, by_field = dependents
+        if field_names is None:
+            return set(all_ids)
+        stale = set()
+        for field_name in field_names:
+            stale.update(by_field.get(field_name, ()))
+        return stale
+
+    @api.model
+    def _mark_stale_after_commit(self, component_ids):
+        """Mark the stored values of the cards stale once the current transaction commits
+
+        Done on a separate cursor after the commit: updating the value rows
+        in the writer's transaction would hold their locks while the same
+        request computes cards through the value store's own cursor.
+        """
+        if not component_ids:
+            return
+        postcommit = self.env.cr.postcommit
+        pending = postcommit.data.get(_STALE_KEY)
+        if pending is None:
+            pending = postcommit.data[_STALE_KEY] = set()
+            postcommit.add(functools.partial(self._flush_stale, self.env.registry, pending))
+        pending.update(component_ids)
+
+    @api.model
+    def _flush_stale(self, registry, component_ids):
+        with registry.cursor() as cr:
+            for attempt in range(1, _STALE_ATTEMPTS + 1):
+                try:
+                    self.env['dashboard.custom.value']._mark_stale(cr, component_ids)
+                    cr.commit()
+                    return
+                except SerializationFailure:
+                    # A card value was stored concurrently; the mark must still land
+                    cr.rollback()
+            _logger.warning("Could not mark the values of cards %s stale after %s attempts",
+                            sorted(component_ids), _STALE_ATTEMPTS)
+
+
+class DashboardComponent(models.Model):
+    _inherit = "dashboard.custom.component"
+
+    dependency_ids = fields.One2many('dashboard.custom.dependency', 'component_id', string="Dependencies",
+                                     readonly=True)
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        components = super().create(vals_list)
+        components._rebuild_dependencies()
+        return components
+
+    def write(self, vals):
+        result = super().write(vals)
+        if DEPENDENCY_SOURCE_FIELDS.intersection(vals):
+            self._rebuild_dependencies()
+        if VALUE_SOURCE_FIELDS.intersection(vals):
+            # Values computed with the former configuration
+            self.env['dashboard.custom.dependency']._mark_stale_after_commit(set(self.ids))
+        return result
+
+    def unlink(self):
+        Dependency = self.env['dashboard.custom.dependency'].sudo()
+        models_before = Dependency._get_indexed_models()
+        result = super().unlink()
+        Dependency._index_changed(models_before)
+        return result
+
+    def _rebuild_dependencies(self):
+        """Re-parse the configuration of the cards and replace their index rows"""
+        if not self:
+            return
+        Dependency = self.env['dashboard.custom.dependency'].sudo()
+        models_before = Dependency._get_indexed_models()
+        Dependency.search([('component_id', 'in', self.ids)]).unlink()
+        Dependency.create([
+            {'component_id': component.id, 'model': model_name, 'field_name': field_name}
+            for component in self
+            for model_name, field_name in sorted(component._parse_dependencies())
+        ])
+        Dependency._index_changed(models_before)
+
+    def _parse_dependencies(self):
+        """(model, field) pairs read by the card, from its model, domain, count
+        field, formula and options"""
+        self.ensure_one()
+        model_name = self._get_source_model_name()
+        if not model_name or model_name not in self.env:
+            return set()
+        model = self.env[model_name]
+
+        paths = set(CALCULATION_DEPENDENCIES.get(self.calculation_type, ()))
+        paths.update(self._parse_domain_paths())
+        if self.count_field:
+            paths.add(self.count_field)
+        if self.formula:
+            paths.update(self._parse_formula_paths(model))
+        if self.filter_by_current_user:
+            paths.update(name for name in USER_FILTER_FIELDS if name in model._fields)
+        if self.comparison_period and self.comparison_date_field:
+            paths.add(self.comparison_date_field)
+        paths.update(self._get_drilldown_groupby())
+
+        dependencies = set()
+        for path in paths:
+            dependencies.update(self._resolve_field_path(model, path))
+        if not dependencies:
+            # Plain count: depends on the records only
+            dependencies.add((model_name, 'id'))
+        return dependencies
+
+    def _parse_domain_paths(self):
+        """Field paths of the domain leaves, read from the expression without evaluating it"""
+        if not self.domain or self.domain == "[]":
+            return set()
+        try:
+            tree = ast.parse(self.domain, mode='eval')
+        except SyntaxError:
+            return set()
+        paths = set()
+        for node in ast.walk(tree):
+            if isinstance(node, (ast.Tuple, ast.List)) and len(node.elts) == 3:
+                left = node.elts[0]
+                if isinstance(left, ast.Constant) and isinstance(left.value, str) and _FIELD_PATH.match(left.value):
+                    paths.add(left.value)
+        return paths
+
+    def _parse_formula_paths(self, model):
+        """Field paths a formula may read: string literals (``mapped('a.b')``,
+        ``stream_sum('amount')``) and attribute names of the model's fields"""
+        try:
+            tree = ast.parse(self.formula, mode='eval')
+        except SyntaxError:
+            return set()
+        paths = set()
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Constant) and isinstance(node.value, str) and _FIELD_PATH.match(node.value):
+                paths.add(node.value)
+            elif isinstance(node, ast.Attribute) and node.attr in model._fields:
+                paths.add(node.attr)
+        return paths
+
+    @api.model
+    def _resolve_field_path(self, model, path):
+        """(model, field) pairs along a dotted field path, up to its first unknown field"""
+        pairs = set()
+        for name in path.split(':')[0].split('.'):
+            field = model._fields.get(name)
+            if field is None:
+                break
+            pairs.add((model._name, name))
+            if not field.relational:
+                break
+            model = self.env[field.comodel_name]
+        return pairs
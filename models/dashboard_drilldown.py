@@ -0,0 +1,190 @@
+import datetime
+import functools
+import json
+import logging
+import time
+
+from dateutil.relativedelta import relativedelta
+
+from odoo import models, fields, api, _
+from odoo.exceptions import ValidationError
+from odoo.tools.safe_eval import safe_eval
+
+from ..tools.single_flight import single_flight
+
+_logger = logging.getLogger(__name__)
+
+# Group-by fields of one drill-down, each read with its own read_group
+DRILLDOWN_MAX_FIELDS = 4
+
+# Distinct values of all the drill-down fields of a card, as estimated by the
+# planner statistics: the size of the read_group results
+DRILLDOWN_MAX_GROUPS = 2000
+
+
+class DashboardComponent(models.Model):
+    _inherit = "dashboard.custom.component"
+
+    drilldown_groupby = fields.Char("Drill-down Fields",
+                                    help="Comma-separated fields to break the card down by when it is "
+                                         "clicked, e.g. 'facilitator_id, session_type, event_id'. "
+                                         "Dates accept a granularity: 'create_date:month'.")
+    drilldown_limit = fields.Integer("Values per Field", default=10,
+                                     help="Largest values listed per drill-down field; the others are "
+                                          "summed up as 'Other'")
+
+    @api.constrains('drilldown_groupby', 'model_id', 'calculation_type')
+    def _check_drilldown_groupby(self):
+        for component in self.filtered('drilldown_groupby'):
+            model_name = component._get_source_model_name()
+            if not model_name or model_name not in self.env:
+                raise ValidationError(_("%s: drill-down needs a data model.") % component.name)
+            specs = component._get_drilldown_groupby()
+            if len(specs) > DRILLDOWN_MAX_FIELDS:
+                raise ValidationError(_("%(card)s: at most %(max)s drill-down fields.") % {
+                    'card': component.name, 'max': DRILLDOWN_MAX_FIELDS})
+            model = self.env[model_name]
+            groups = 0
+            for spec in specs:
+                field = model._fields.get(spec.split(':')[0])
+                if not field or not (field.store and field.column_type or field.group_expand):
+                    raise ValidationError(_("%(card)s: %(field)s cannot be grouped on %(model)s.") % {
+                        'card': component.name, 'field': spec, 'model': model_name})
+                groups += component._estimate_group_count(model, field)
+            if groups > DRILLDOWN_MAX_GROUPS:
+                raise ValidationError(_(
+                    "%(card)s: the drill-down fields have about %(groups)s distinct values, more than "
+                    "%(max)s. Drop the fields with many values (e.g. partners).") % {
+                    'card': component.name, 'groups': int(groups), 'max': DRILLDOWN_MAX_GROUPS})
+
+    @api.model
+    def _estimate_group_count(self, model, field):
+        """Distinct values of a column according to the planner statistics;
+        0 when unknown, and for dates, grouped by a bounded granularity"""
+        if field.type in ('date', 'datetime') or not (field.store and field.column_type):
+            return 0
+        self.env.cr.execute("""
+            SELECT s.n_distinct, c.reltuples FROM pg_stats s
+              JOIN pg_class c ON c.relname = s.tablename
+              JOIN pg_namespace n ON n.oid = c.relnamespace AND n.nspname = s.schemaname
+             WHERE s.schemaname = current_schema() AND s.tablename = %s AND s.attname = %s
+        """, (model._table, field.name))
+        row = self.env.cr.fetchone()
+        if not row:
+            return 0
+        n_distinct, reltuples = row
+        # Negative: a fraction of the rows
+        return n_distinct if n_distinct >= 0 else -n_distinct * max(reltuples, 0)
+
+    def _get_drilldown_groupby(self):
+        self.ensure_one()
+        return [spec.strip() for spec in (self.drilldown_groupby or '').split(',') if spec.strip()]
+
+    def _get_drilldown(self):
+        """Facet counts behind the card, cached in the value store like card values
+
+        :return: {'total': int, 'facets': [{'field', 'label', 'values': [{'value',
+                 'label', 'count'}], 'other': int}]}
+        """
+        self.ensure_one()
+        ICP = self.env['ir.config_parameter'].sudo()
+        ttl = int(ICP.get_param('dashboard_custom.drilldown_cache_ttl', 300))
+        if self._is_time_dependent():
+            ttl = min(ttl, int(ICP.get_param('dashboard_custom.single_flight_window', 5)))
+        lock_timeout = int(ICP.get_param('dashboard_custom.single_flight_lock_timeout', 10))
+        # Labels are translated
+        scope_key = 'drilldown:%s:%s' % (self.env.lang or '', self._get_scope_key())
+        compute = functools.partial(
+            self._compute_card_data_locked, scope_key, ttl, lock_timeout, self._compute_drilldown_timed)
+        value, __ = single_flight.do((self.env.cr.dbname, self.id, scope_key), compute)
+        return json.loads(value)
+
+    def _compute_drilldown_timed(self):
+        started = time.monotonic()
+        facets = self._compute_drilldown()
+        return json.dumps(facets), (time.monotonic() - started) * 1000
+
+    def _compute_drilldown(self):
+        """Break the card records down by each drill-down field, one read_group per field
+
+        Each field keeps its ``drilldown_limit`` largest values.
+        """
+        self.ensure_one()
+        model = self.env[self._get_source_model_name()]
+        groupby = self._get_drilldown_groupby()
+        domain = self._get_drilldown_domain(model)
+        total = model.search_count(domain)
+
+        limit = max(self.drilldown_limit or 10, 1)
+        facets = []
+        for spec in groupby:
+            counts = {}
+            for group in model.read_group(domain, ['__count'], [spec], lazy=False):
+                key, label = self._get_drilldown_key(model, spec, group[spec])
+                entry = counts.setdefault(key, [label, 0])
+                entry[1] += group['__count']
+            ranked = sorted(counts.items(), key=lambda item: -item[1][1])
+            facets.append({
+                'field': spec,
+                'label': model._fields[spec.split(':')[0]]._description_string(self.env),
+                'values': [{'value': key, 'label': label, 'count': count}
+                           for key, (label, count) in ranked[:limit]],
+                'other': sum(count for __, (__, count) in ranked[limit:]),
+            })
+        return {'total': total, 'facets': facets}
+
+    def _get_drilldown_domain(self, model):
+        """Domain of the records the card value is computed from
+
+        Participation cards apply their own filters, those of
+        ``_compute_completion_rate`` and ``_compute_facilitator_performance``.
+        """
+        self.ensure_one()
+        if self.calculation_type not in ('completion_rate', 'facilitator_performance'):
+            return self._prepare_card_domain(model)
+
+        domain = []
+        if self.domain and self.domain != "[]":
+            try:
+                domain = list(safe_eval(self.domain, {
+                    'datetime': datetime,
+                    'relativedelta': relativedelta,
+                    'date': datetime.date,
+                    'today': fields.Date.today(),
+                    'now': fields.Datetime.now(),
+                    'uid': self.env.uid,
+                    'user': self.env.user,
+                }))
+            except Exception as e:
+                _logger.error("Domain evaluation error in drill-down: %s", e)
+        user_facilitator = self.filter_by_current_user and self.env.user.partner_id.is_facilitator
+
+        if self.calculation_type == 'completion_rate':
+            if self.facilitator_id:
+                domain.append(('facilitator_id', '=', self.facilitator_id.id))
+            if self.session_type == 'kickoff':
+                domain.append(('session_type', '=', 'kickoff'))
+            elif self.session_type == 'followup':
+                domain.append(('session_type', '!=', 'kickoff'))
+            if user_facilitator:
+                domain.append(('facilitator_id', '=', self.env.user.partner_id.id))
+            return domain
+
+        facilitator = self.facilitator_id or (self.env.user.partner_id if user_facilitator else False)
+        if facilitator:
+            domain.append(('facilitator_id', '=', facilitator.id))
+        if self.performance_window_days:
+            domain.append(('create_date', '>=', fields.Datetime.to_datetime(self._get_performance_window_start())))
+        return domain
+
+    def _get_drilldown_key(self, model, spec, value):
+        """JSON-friendly (key, label) of a read_group value"""
+        if value is False or value is None:
+            return False, _("None")
+        if isinstance(value, tuple):
+            # many2one: (id, display name)
+            return value[0], str(value[1])
+        field = model._fields[spec.split(':')[0]]
+        if field.type == 'selection':
+            return value, dict(field._description_selection(self.env)).get(value, value)
+        return str(value), str(value)
@@ -0,0 +1,244 @@
+import base64
+import logging
+
+from dateutil.relativedelta import relativedelta
+
+from odoo import models, fields, api
+
+from ..tools.hyperloglog import HyperLogLog
+
+_logger = logging.getLogger(__name__)
+
+# Participation fields the sketches are built from
+SKETCHED_FIELDS = {'facilitator_id', 'event_id', 'partner_id'}
+
+# Version of the stored sketches; older ones are rebuilt by the cron
+SKETCH_LAYOUT = '2'
+
+
+class DashboardHllSketch(models.Model):
+    """Distinct events/participants of one facilitator (or of all participations)
+    on one day, rolled up per month.
+
+    Sketches are mergeable, so the distinct count over any range of days (and
+    any set of facilitators) comes from merging the stored sketches instead of
+    scanning participations. Whole months are read from their monthly rollup,
+    so a window needs at most one sketch per month plus the days of its first
+    month.
+    """
+    _name = "dashboard.custom.hll.sketch"
+    _description = "Dashboard Distinct-Count Sketch"
+    _log_access = False
+
+    facilitator_id = fields.Many2one('res.partner', string="Facilitator",
+                                     ondelete='cascade', index=True,
+                                     help="Empty for the sketches of all participations, "
+                                          "with or without facilitator")
+    day = fields.Date("Day", required=True, index=True,
+                      help="First day of the month for monthly rollups")
+    period = fields.Selection([
+        ('day', 'Day'),
+        ('month', 'Month'),
+    ], string="Period", required=True, default='day')
+    kind = fields.Selection([
+        ('events', 'Events'),
+        ('participants', 'Participants'),
+    ], string="Counted Values", required=True)
+    sketch = fields.Binary("Sketch", attachment=False)
+
+    _sql_constraints = [
+        ('facilitator_day_kind_uniq', 'unique(facilitator_id, day, kind, period)',
+         "Only one sketch per facilitator, day, kind and period is allowed."),
+    ]
+
+    @api.model
+    def _get_precision(self):
+        return int(self.env['ir.config_parameter'].sudo().get_param('dashboard_custom.hll_precision', 14))
+
+    @api.model
+    def _build_sketches(self, date_from, date_to):
+        """(Re)build the daily sketches of every facilitator, and of all
+        participations, for the days in [date_from, date_to]"""
+        if 'inclue.participation' not in self.env:
+            return
+        precision = self._get_precision()
+        self.env['inclue.participation'].flush_model(['facilitator_id', 'event_id', 'partner_id'])
+        self.env.cr.execute("""
+            SELECT GROUPING(facilitator_id) = 1, facilitator_id, create_date::date,
+                   array_agg(DISTINCT event_id) FILTER (WHERE event_id IS NOT NULL),
+                   array_agg(DISTINCT partner_id) FILTER (WHERE partner_id IS NOT NULL)
+              FROM inclue_participation
+             WHERE create_date >= %s AND create_date < %s
+             GROUP BY GROUPING SETS ((facilitator_id, create_date::date), (create_date::date))
+        """, (date_from, date_to + relativedelta(days=1)))
+
+        vals_list = []
+        for all_facilitators, facilitator_id, day, event_ids, partner_ids in self.env.cr.fetchall():
+            if not all_facilitators and not facilitator_id:
+                # Participations without facilitator only count in the overall sketches
+                continue
+            for kind, values in (('events', event_ids), ('participants', partner_ids)):
+                if not values:
+                    continue
+                sketch = HyperLogLog(precision).update(values)
+                vals_list.append({
+                    'facilitator_id': facilitator_id,
+                    'day': day,
+                    'period': 'day',
+                    'kind': kind,
+                    'sketch': base64.b64encode(sketch.to_bytes()),
+                })
+
+        self.search([('period', '=', 'day'), ('day', '>=', date_from), ('day', '<=', date_to)]).unlink()
+        self.create(vals_list)
+
+    @api.model
+    def _build_month_sketches(self, months):
+        """(Re)build the monthly rollups of the given months (first days) by
+        merging their daily sketches"""
+        for month in sorted(months):
+            grouped = {}
+            days = self.search([
+                ('period', '=', 'day'),
+                ('day', '>=', month),
+                ('day', '<', month + relativedelta(months=1)),
+            ])
+            for row in days.read(['facilitator_id', 'kind', 'sketch'], load=None):
+                if row['sketch']:
+                    grouped.setdefault((row['facilitator_id'], row['kind']), []).append(
+                        HyperLogLog.from_bytes(base64.b64decode(row['sketch'])))
+            days.invalidate_recordset()
+
+            vals_list = []
+            for (facilitator_id, kind), sketches in grouped.items():
+                # Days built before a precision change are folded to the lowest one
+                merged = HyperLogLog(min(sketch.precision for sketch in sketches))
+                for sketch in sketches:
+                    merged.merge(sketch)
+                vals_list.append({
+                    'facilitator_id': facilitator_id,
+                    'day': month,
+                    'period': 'month',
+                    'kind': kind,
+                    'sketch': base64.b64encode(merged.to_bytes()),
+                })
+            self.search([('period', '=', 'month'), ('day', '=', month)]).unlink()
+            self.create(vals_list)
+
+    @api.model
+    def _cron_update_sketches(self):
+        """Build the sketches of the days elapsed since the last run (today
+        included), rebuild the earlier days whose participations changed,
+        and the monthly rollups of all these days"""
+        if 'inclue.participation' not in self.env:
+            return
+        ICP = self.env['ir.config_parameter'].sudo()
+        today = fields.Date.today()
+        last_day = ICP.get_param('dashboard_custom.hll_built_until')
+        if ICP.get_param('dashboard_custom.hll_layout') != SKETCH_LAYOUT:
+            # Sketches built before the overall and monthly ones existed
+            last_day = False
+        if last_day:
+            # The last built day may have been partial
+            date_from = fields.Date.from_string(last_day)
+        else:
+            self.env.cr.execute("SELECT min(create_date)::date FROM inclue_participation")
+            date_from = self.env.cr.fetchone()[0] or today
+
+        # Claimed by deleting them: days marked again meanwhile are kept for the next run
+        self.env.cr.execute("DELETE FROM dashboard_custom_hll_dirty_day RETURNING day")
+        dirty_days = sorted(day for day, in self.env.cr.fetchall() if day < date_from)
+        for day in dirty_days:
+            self._build_sketches(day, day)
+        self._build_month_sketches({day.replace(day=1) for day in dirty_days})
+        self.env.cr.commit()
+        if dirty_days:
+            _logger.info("Dashboard distinct-count sketches rebuilt for %s changed days", len(dirty_days))
+
+        while date_from <= today:
+            # Whole months, so each chunk completes its monthly rollup
+            date_to = min(date_from + relativedelta(day=31), today)
+            self._build_sketches(date_from, date_to)
+            self._build_month_sketches({date_from.replace(day=1)})
+            ICP.set_param('dashboard_custom.hll_built_until', fields.Date.to_string(date_to))
+            self.env.cr.commit()
+            date_from = date_to + relativedelta(days=1)
+        ICP.set_param('dashboard_custom.hll_layout', SKETCH_LAYOUT)
+        _logger.info("Dashboard distinct-count sketches built up to %s", today)
+
+    @api.model
+    def _estimate_distinct(self, kind, facilitator_ids=None, date_from=None, precision=None):
+        """Approximate number of distinct events/participants from merged sketches
+
+        :param facilitator_ids: restrict to these facilitators (all
+                                participations when falsy)
+        :param date_from: first day of the window (all time when falsy)
+        :param precision: target precision; sketches stored at a higher
+                          precision are folded down to it
+        """
+        domain = [('kind', '=', kind)]
+        if facilitator_ids:
+            domain.append(('facilitator_id', 'in', facilitator_ids))
+        else:
+            domain.append(('facilitator_id', '=', False))
+        # Monthly rollups, plus the days of a partially covered first month
+        periods = [('period', '=', 'month')]
+        if date_from:
+            first_month = date_from.replace(day=1)
+            if first_month == date_from:
+                periods.append(('day', '>=', first_month))
+            else:
+                periods = ['|', '&', ('period', '=', 'month'), ('day', '>', first_month),
+                           '&', '&', ('period', '=', 'day'), ('day', '>=', date_from),
+                           ('day', '<', first_month + relativedelta(months=1))]
+        domain += periods
+
+        sketches = [
+            HyperLogLog.from_bytes(base64.b64decode(row['sketch']))
+            for row in self.search_read(domain, ['sketch']) if row['sketch']
+        ]
+        if not sketches:
+            return 0
+        precision = min([precision or self._get_precision()] + [s.precision for s in sketches])
+        merged = HyperLogLog(precision)
+        for sketch in sketches:
+            merged.merge(sketch)
+        return merged.count()
+
+
+class DashboardHllDirtyDay(models.Model):
+    """Days whose participations were changed or deleted, so their already
+    built sketches must be rebuilt"""
+    _name = "dashboard.custom.hll.dirty.day"
+    _description = "Dashboard Sketch Day To Rebuild"
+    _log_access = False
+
+    day = fields.Date("Day", required=True)
+
+    _sql_constraints = [
+        ('day_uniq', 'unique(day)', "A day is only marked once."),
+    ]
+
+    @api.model
+    def _mark_participations(self, participations):
+        """Mark the creation days of the participations, the days their sketches cover"""
+        if not participations:
+            return
+        self.env.cr.execute("""
+            INSERT INTO dashboard_custom_hll_dirty_day (day)
+            SELECT DISTINCT create_date::date FROM inclue_participation WHERE id IN %s
+            ON CONFLICT (day) DO NOTHING
+        """, (tuple(participations.ids),))
+
+
+class InclueParticipation(models.Model):
+    _inherit = "inclue.participation"
+
+    def write(self, vals):
+        if SKETCHED_FIELDS.intersection(vals):
+            self.env['dashboard.custom.hll.dirty.day']._mark_participations(self)
+        return super().write(vals)
+
+    def unlink(self):
+        self.env['dashboard.custom.hll.dirty.day']._mark_participations(self)
+        return super().unlink()
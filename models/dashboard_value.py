@@ -0,0 +1,151 @@
+from psycopg2.errors import SerializationFailure
+
+from odoo import models, fields, api
+
+
+class DashboardValue(models.Model):
+    """Last computed value of a card, per scope.
+
+    Rows are read and written with plain SQL on a dedicated cursor so that
+    values computed by one worker are visible to the others as soon as they
+    are committed, regardless of the requesting transaction's snapshot.
+    """
+    _name = "dashboard.custom.value"
+    _description = "Dashboard Card Value"
+    _log_access = False
+
+    component_id = fields.Many2one('dashboard.custom.component', string="Component",
+                                   required=True, ondelete='cascade', index=True)
+    scope_key = fields.Char("Scope", required=True,
+                            help="'global', 'rules:<hash>' for users with the same record rules, or "
+                                 "'user:<id>' for cards depending on the current user, suffixed "
+                                 "with ':<timezone>' for comparison cards; "
+                                 "drill-down facets use 'drilldown:<lang>:<scope>'")
+    value = fields.Char("Value")
+    computed_at = fields.Datetime("Computed At")
+    duration_ms = fields.Float("Computation Time (ms)")
+    recompute_claimed_at = fields.Datetime(
+        "Recompute Claimed At", help="Last time a worker claimed the right to recompute the value, "
+                                     "for cards with a minimum recompute interval")
+    stale = fields.Boolean("Stale", default=False,
+                           help="Set when a write touched data the card depends on")
+    stale_at = fields.Datetime("Marked Stale At",
+                               help="Last time a write touched data the card depends on")
+
+    _sql_constraints = [
+        ('component_scope_uniq', 'unique(component_id, scope_key)',
+         "A card can only have one stored value per scope."),
+    ]
+
+    @api.model
+    def _get_recent_value(self, cr, component_id, scope_key, max_age):
+        """Return (value, age in seconds) if the stored value was computed less
+        than ``max_age`` seconds ago and no write made it stale since"""
+        cr.execute("""
+            SELECT value, extract(epoch FROM (clock_timestamp() at time zone 'UTC') - computed_at)
+              FROM dashboard_custom_value
+             WHERE component_id = %s AND scope_key = %s AND NOT stale
+               AND computed_at >= (now() at time zone 'UTC') - %s * interval '1 second'
+        """, (component_id, scope_key, max_age))
+        return cr.fetchone()
+
+    @api.model
+    def _claim_recompute(self, cr, component_id, scope_key, min_interval):
+        """Claim the next recomputation of a value, at most once per ``min_interval`` seconds
+
+        The claim is a conditional UPDATE of the value row, so a single worker
+        wins it per interval. Commits ``cr``.
+
+        :return: None when the caller may recompute (claim won, or nothing
+                 stored yet), otherwise the last (value, age in seconds)
+        """
+        try:
+            cr.execute("""
+                UPDATE dashboard_custom_value SET recompute_claimed_at = clock_timestamp() at time zone 'UTC'
+                 WHERE component_id = %s AND scope_key = %s
+                   AND (recompute_claimed_at IS NULL
+                        OR recompute_claimed_at <= (clock_timestamp() at time zone 'UTC') - %s * interval '1 second')
+             RETURNING id
+            """, (component_id, scope_key, min_interval))
+            claimed = bool(cr.fetchone())
+            cr.commit()
+        except SerializationFailure:
+            # Another worker updated the row concurrently: it won the claim
+            cr.rollback()
+            claimed = False
+        if claimed:
+            return None
+        cr.execute("""
+            SELECT value, extract(epoch FROM (clock_timestamp() at time zone 'UTC') - computed_at)
+              FROM dashboard_custom_value
+             WHERE component_id = %s AND scope_key = %s
+        """, (component_id, scope_key))
+        return cr.fetchone()
+
+    @api.model
+    def _store_value(self, cr, component_id, scope_key, value, duration_ms=None, snapshot_at=None):
+        """Store a computed value, unless a write marked the row stale after
+        the value's data was read
+
+        :param snapshot_at: start of the transaction the value was computed
+                            in (UTC); a stale mark at or after it may concern
+                            data that transaction could not see
+        :return: whether the value was stored
+        """
+        try:
+            cr.execute("""
+                INSERT INTO dashboard_custom_value (component_id, scope_key, value, computed_at, duration_ms,
+                                                    stale, recompute_claimed_at)
+                VALUES (%s, %s, %s, clock_timestamp() at time zone 'UTC', %s, false,
+                        clock_timestamp() at time zone 'UTC')
+                ON CONFLICT (component_id, scope_key)
+                DO UPDATE SET value = EXCLUDED.value, computed_at = EXCLUDED.computed_at,
+                              duration_ms = EXCLUDED.duration_ms, stale = false
+                 WHERE %s::timestamp IS NULL OR dashboard_custom_value.stale_at IS NULL
+                    OR dashboard_custom_value.stale_at < %s::timestamp
+             RETURNING id
+            """, (component_id, scope_key, value, duration_ms, snapshot_at, snapshot_at))
+            return bool(cr.fetchone())
+        except SerializationFailure:
+            # The row was marked stale since this transaction started
+            cr.rollback()
+            return False
+
+    @api.model
+    def _mark_stale(self, cr, component_ids):
+        """Flag every stored value (all scopes) of the given components as stale
+
+        The mark time is updated even on rows already stale: values being
+        computed meanwhile must not clear it, see ``_store_value``.
+        """
+        if not component_ids:
+            return
+        cr.execute("""
+            UPDATE dashboard_custom_value SET stale = true, stale_at = clock_timestamp() at time zone 'UTC'
+             WHERE component_id IN %s
+        """, (tuple(component_ids),))
+
+    @api.model
+    def _get_last_values(self, component_ids, scope_key='global'):
+        """Last stored value of each component for a scope, however old, unless
+        stale: {component_id: value}"""
+        if not component_ids:
+            return {}
+        self.env.cr.execute("""
+            SELECT component_id, value FROM dashboard_custom_value
+             WHERE component_id IN %s AND scope_key = %s AND NOT stale
+        """, (tuple(component_ids), scope_key))
+        return dict(self.env.cr.fetchall())
+
+    @api.model
+    def _get_slowest_durations(self, component_ids):
+        """Slowest recorded computation time of each component: {component_id: ms}"""
+        if not component_ids:
+            return {}
+        self.env.cr.execute("""
+            SELECT component_id, max(duration_ms) FROM dashboard_custom_value
+             WHERE component_id IN %s AND duration_ms IS NOT NULL
+               AND scope_key NOT LIKE 'drilldown:%%'
+             GROUP BY component_id
+        """, (tuple(component_ids),))
+        return dict(self.env.cr.fetchall())
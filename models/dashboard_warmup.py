@@ -0,0 +1,99 @@
+import logging
+import time
+
+from dateutil.relativedelta import relativedelta
+
+from odoo import models, fields, api
+
+_logger = logging.getLogger(__name__)
+
+
+class DashboardComponent(models.Model):
+    _inherit = "dashboard.custom.component"
+
+    def _register_hook(self):
+        """Schedule a warm-up once per installation or upgrade of the module
+
+        Every worker loads the registry, and reloads it on each invalidation:
+        the version of the module the last warm-up was scheduled for is kept
+        in a parameter, so only the first load after an upgrade triggers it.
+        """
+        super()._register_hook()
+        cron = self.env.ref('dashboard_custom.ir_cron_dashboard_warmup', raise_if_not_found=False)
+        if not cron or not cron.active:
+            return
+        module = self.env['ir.module.module'].sudo().search([('name', '=', 'dashboard_custom')], limit=1)
+        version = '%s@%s' % (module.latest_version, module.write_date)
+        ICP = self.env['ir.config_parameter'].sudo()
+        if ICP.get_param('dashboard_custom.warmup_version') != version:
+            ICP.set_param('dashboard_custom.warmup_version', version)
+            cron._trigger()
+
+    @api.model
+    def _get_warmup_users(self):
+        """Users to warm the cards for, grouped by role
+
+        Recently active users first; when nobody logged in lately, one user of
+        each role stands in for it.
+
+        :return: {'facilitator': res.users, 'participant': res.users}
+        """
+        ICP = self.env['ir.config_parameter'].sudo()
+        per_role = int(ICP.get_param('dashboard_custom.warmup_users_per_role', 10))
+        since = fields.Datetime.now() - relativedelta(days=7)
+
+        Users = self.env['res.users'].sudo()
+        self.env.cr.execute("""
+            SELECT create_uid FROM res_users_log
+             WHERE create_date >= %s
+             GROUP BY create_uid
+             ORDER BY max(create_date) DESC
+        """, (since,))
+        recent = Users.browse([row[0] for row in self.env.cr.fetchall()]).exists()
+        recent = recent.filtered(lambda u: u.active and not u.share and not u._is_superuser())
+
+        has_roles = 'is_facilitator' in self.env['res.partner']._fields
+        roles = {'facilitator': Users, 'participant': Users}
+        for user in recent:
+            role = 'facilitator' if has_roles and user.partner_id.is_facilitator else 'participant'
+            if len(roles[role]) < per_role:
+                roles[role] |= user
+
+        base_domain = [('share', '=', False), ('id', '!=', self.env.ref('base.user_root').id)]
+        if not roles['facilitator'] and has_roles:
+            roles['facilitator'] = Users.search(base_domain + [('partner_id.is_facilitator', '=', True)], limit=1)
+        if not roles['participant']:
+            domain = base_domain + ([('partner_id.is_facilitator', '=', False)] if has_roles else [])
+            roles['participant'] = Users.search(domain, limit=1)
+        return roles
+
+    @api.model
+    def _cron_warmup_dashboards(self):
+        """Precompute every active card for each role scope, slowest cards first
+
+        Only the shared value store is warmed: templates and rendered card
+        fragments are cached per process, and this runs in the cron worker,
+        not in the HTTP workers that serve the dashboard.
+        """
+        started = time.monotonic()
+        cards = self.sudo().search([('is_active', '=', True), ('component_type', '=', 'card')])
+        if not cards:
+            return
+        durations = self.env['dashboard.custom.value'].sudo()._get_slowest_durations(cards.ids)
+        cards = cards.sorted(lambda c: (-durations.get(c.id, 0.0), c.sequence, c.id))
+
+        warmed_users = 0
+        for role, users in self._get_warmup_users().items():
+            for user in users:
+                user_cards = cards.with_user(user).with_context(lang=user.lang)
+                try:
+                    user_cards._compute_cards_shared()
+                except Exception:
+                    _logger.exception("Dashboard warm-up failed for %s user %s", role, user.login)
+                    self.env.cr.rollback()
+                    continue
+                warmed_users += 1
+                self.env.cr.commit()
+
+        _logger.info("Dashboard warm-up: %s cards for %s users in %.1fs",
+                     len(cards), warmed_users, time.monotonic() - started)
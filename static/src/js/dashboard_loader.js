@@ -0,0 +1,42 @@
+odoo.define('dashboard_custom.dashboard_loader', function (require) {
+    'use strict';
+
+    var publicWidget = require('web.public.widget');
+    var {getBundle, loadBundle} = require('@web/core/assets');
+
+    var BUNDLE = 'dashboard_custom.assets_dashboard';
+    var bundleLoaded = null;
+
+    /**
+     * Only part of the dashboard shipped with every website page: loads the
+     * dashboard bundle the first time a dashboard is on the page, then
+     * attaches the dashboard widget (registered by that bundle as
+     * ``DashboardLoader.Dashboard``) to the snippet.
+     */
+    var DashboardLoader = publicWidget.Widget.extend({
+        selector: '.dashboard-component',
+
+        start: function () {
+            var self = this;
+            if (!bundleLoaded) {
+                bundleLoaded = getBundle(BUNDLE).then(loadBundle);
+            }
+            // Not awaited: the rest of the page does not wait for the dashboard
+            bundleLoaded.then(function () {
+                if (self.isDestroyed()) {
+                    return;
+                }
+                self.dashboard = new DashboardLoader.Dashboard(self);
+                return self.dashboard.attachTo(self.$el);
+            }).catch(function (error) {
+                bundleLoaded = null;
+                console.error("Failed to load the dashboard:", error);
+            });
+            return this._super.apply(this, arguments);
+        },
+    });
+
+    publicWidget.registry.dashboardLoader = DashboardLoader;
+
+    return DashboardLoader;
+});
@@ -3,121 +3,470 @@ odoo.define('dashboard_custom.dashboard_snippet', function (require) {
     
     var publicWidget = require('web.public.widget');
     var ajax = require('web.ajax');
-    
-    publicWidget.registry.dashboardWidget = publicWidget.Widget.extend({
+    var core = require('web.core');
+    var DashboardLoader = require('dashboard_custom.dashboard_loader');
+    var {sprintf} = require('@web/core/utils/strings');
+
+    var _t = core._t;
+
+    // Tracing only in debug mode
+    var debugLog = odoo.debug ? console.log.bind(console) : function () {};
+
+    /**
+     * Page-level refresh coordinator shared by every dashboard widget.
+     *
+     * One request per tick for the union of the cards visible in all
+     * registered widgets; results are fanned out to each widget. Polling
+     * pauses while the tab is hidden and backs off exponentially on errors.
+     */
+    var RefreshCoordinator = {
+        interval: 60000, // 1 minute
+        maxInterval: 15 * 60000,
+        widgets: [],
+        failures: 0,
+        timer: null,
+        meta: null,
+        pendingIds: [],
+        _visibilityBound: false,
+
+        register: function (widget) {
+            if (this.widgets.indexOf(widget) === -1) {
+                this.widgets.push(widget);
+            }
+            if (!this._visibilityBound) {
+                document.addEventListener('visibilitychange', this._onVisibilityChange);
+                this._visibilityBound = true;
+            }
+            if (!this.timer) {
+                this._schedule(this.interval);
+            }
+        },
+
+        /**
+         * Refresh the given cards right away, e.g. the last-known values a
+         * cached page was rendered with. Calls made during the same tick
+         * are merged into one request.
+         */
+        hydrate: function (ids) {
+            this.pendingIds = _.union(this.pendingIds, ids);
+            this._schedule(0);
+        },
+
+        unregister: function (widget) {
+            this.widgets = _.without(this.widgets, widget);
+            if (!this.widgets.length) {
+                this._stop();
+                document.removeEventListener('visibilitychange', this._onVisibilityChange);
+                this._visibilityBound = false;
+            }
+        },
+
+        _stop: function () {
+            clearTimeout(this.timer);
+            this.timer = null;
+        },
+
+        _schedule: function (delay) {
+            var self = this;
+            this._stop();
+            if (document.hidden || !this.widgets.length) {
+                return;
+            }
+            this.timer = setTimeout(function () {
+                self.timer = null;
+                self._tick();
+            }, delay);
+        },
+
+        _nextDelay: function () {
+            return Math.min(this.interval * Math.pow(2, this.failures), this.maxInterval);
+        },
+
+        _onVisibilityChange: function () {
+            var self = RefreshCoordinator;
+            if (document.hidden) {
+                self._stop();
+            } else {
+                // Catch up on what was missed while hidden
+                self._tick();
+            }
+        },
+
+        _tick: function () {
+            var self = this;
+            var ids = _.union(this.pendingIds, _.flatten(_.invoke(this.widgets, 'getVisibleComponentIds')));
+            this.pendingIds = [];
+            if (!ids.length) {
+                this._schedule(this._nextDelay());
+                return;
+            }
+            debugLog('Auto refresh triggered');
+            // Compact, gzip-able format; static metadata is only resent when
+            // its version changes
+            var params = new URLSearchParams({ids: ids.join(',')});
+            if (this.meta) {
+                params.set('meta_version', this.meta.version);
+            }
+            fetch('/dashboard/refresh_data/compact?' + params.toString(), {credentials: 'same-origin'})
+                .then(function (response) {
+                    if (!response.ok) {
+                        throw new Error(response.statusText);
+                    }
+                    return response.json();
+                })
+                .then(function (result) {
+                    debugLog('Data refresh result:', result);
+                    if (result.error) {
+                        throw new Error(result.error);
+                    }
+                    if (result.meta) {
+                        self.meta = {version: result.version, fields: result.meta.fields, rows: result.meta.rows};
+                    }
+                    self.failures = 0;
+                    _.invoke(self.widgets, 'applyValues', result.ids, result.values, self.meta, result.ages);
+                })
+                .catch(function (error) {
+                    self.failures++;
+                    console.error("Failed to refresh dashboard data:", error);
+                })
+                .finally(function () {
+                    self._schedule(self._nextDelay());
+                });
+        },
+    };
+    _.bindAll(RefreshCoordinator, '_onVisibilityChange');
+
+    /**
+     * Dashboard widget, attached by the loader of the frontend bundle once
+     * this lazily loaded bundle is available.
+     */
+    var DashboardWidget = publicWidget.Widget.extend({
         selector: '.dashboard-component',
         events: {
             'click .dashboard-refresh-btn': '_onRefreshClick',
-        },
-        
-        willStart: function() {
-            console.log('Dashboard widget willStart');
-            return this._super.apply(this, arguments);
+            'click .dashboard-card-col[data-drilldown] > .card': '_onCardClick',
+            'click .dashboard-drilldown-close': '_onDrilldownClose',
         },
         
         start: function () {
-            var self = this;
-            console.log('Dashboard widget start called');
-            
-            // Make this work in both edit and view modes
-            this.$refreshBtn = this.$('.dashboard-refresh-btn');
-            
-            // Add manual event handler as a backup
-            this.$refreshBtn.on('click', function(ev) {
-                console.log('Manual click event fired');
-                ev.preventDefault();
-                self._fullRefreshContent();
-            });
-            
-            // Setup auto refresh
-            this._setupAutoRefresh();
+            this.boardId = parseInt(this.$el.data('board-id')) || null;
+
+            // Load below-the-fold cards once they become visible
+            this._setupLazyLoading();
+
+            // Track which cards are on screen and join the shared poller
+            this._setupVisibilityTracking();
+            RefreshCoordinator.register(this);
+
+            // The markup is saved with the page when the snippet is dropped,
+            // rendered for the default board: load the configured board's
+            // cards when it is not the one the markup was rendered for
+            var $row = this.$('.dashboard-content > .row');
+            var renderedBoardId = parseInt($row.data('board-id')) || null;
+            if (!$row.length || renderedBoardId !== this.boardId) {
+                this._fullRefreshContent();
+            } else if (this.$el.data('hydrate')) {
+                // The page may come from a cache: bring its stored values up to date
+                RefreshCoordinator.hydrate(this._getLoadedComponentIds());
+            }
             
-            console.log('Dashboard widget initialized!');
+            debugLog('Dashboard widget initialized');
             return this._super.apply(this, arguments);
         },
         
         _onRefreshClick: function(ev) {
-            console.log("Refresh button clicked through event binding!");
             ev.preventDefault();
             this._fullRefreshContent();
         },
         
-        _setupAutoRefresh: function() {
-            console.log('Setting up auto refresh');
+        _onCardClick: function(ev) {
+            var componentId = $(ev.currentTarget).parent().data('component-id');
             var self = this;
-            // Set up timer for auto-refresh
-            setInterval(function() {
-                console.log('Auto refresh triggered');
-                self._refreshData();
-            }, 60000); // 1 minute
+            ajax.jsonRpc('/dashboard/drilldown', 'call', {
+                component_id: componentId,
+            }).then(function(result) {
+                if (result.error) {
+                    console.error("Error loading drill-down:", result.error);
+                    return;
+                }
+                self._renderDrilldown(result);
+            }).catch(function(error) {
+                console.error("Failed to load drill-down:", error);
+            });
         },
-        
-        _refreshData: function() {
-            console.log('Refreshing data...');
+
+        _onDrilldownClose: function(ev) {
+            ev.preventDefault();
+            this.$('.dashboard-drilldown').remove();
+        },
+
+        /**
+         * Show the facet counts of a card below the cards, one list per
+         * drill-down field.
+         */
+        _renderDrilldown: function(result) {
+            var $panel = this.$('.dashboard-drilldown');
+            if (!$panel.length) {
+                $panel = $('<div class="dashboard-drilldown card mb-4"/>').insertAfter(this.$('.row').last());
+            }
+            var $header = $('<div class="card-header d-flex justify-content-between align-items-center"/>')
+                .append($('<strong/>').text(result.name + ' (' + result.total + ')'))
+                .append('<button type="button" class="btn-close dashboard-drilldown-close" aria-label="Close"/>');
+            var $body = $('<div class="card-body row"/>');
+            _.each(result.facets, function(facet) {
+                var $list = $('<ul class="list-group list-group-flush"/>');
+                _.each(facet.values, function(value) {
+                    $list.append($('<li class="list-group-item d-flex justify-content-between"/>')
+                        .append($('<span/>').text(value.label))
+                        .append($('<span class="badge bg-secondary"/>').text(value.count)));
+                });
+                if (facet.other) {
+                    $list.append($('<li class="list-group-item d-flex justify-content-between text-muted"/>')
+                        .append($('<span/>').text(_t("Other")))
+                        .append($('<span class="badge bg-light text-dark"/>').text(facet.other)));
+                }
+                $body.append($('<div class="col-md-4 mb-3"/>')
+                    .append($('<h6/>').text(facet.label))
+                    .append($list));
+            });
+            $panel.empty().append($header, $body).attr('data-drilldown-id', result.component_id);
+        },
+
+        _setupVisibilityTracking: function() {
             var self = this;
-            ajax.jsonRpc('/dashboard/refresh_data', 'call', {})
-                .then(function (result) {
-                    console.log('Data refresh result:', result);
-                    if (result.error) {
-                        console.error("Error refreshing dashboard:", result.error);
-                        return;
+            this._visibleIds = null;
+            if (this._visibilityObserver) {
+                this._visibilityObserver.disconnect();
+            }
+            if (!('IntersectionObserver' in window)) {
+                return;
+            }
+            this._visibleIds = {};
+            this._visibilityObserver = new IntersectionObserver(function(entries) {
+                _.each(entries, function(entry) {
+                    var id = $(entry.target).data('component-id');
+                    if (entry.isIntersecting) {
+                        self._visibleIds[id] = true;
+                    } else {
+                        delete self._visibleIds[id];
                     }
-                    
-                    // Update all component values
-                    _.each(result, function(data, id) {
-                        var card = self.$el.find('[data-component-id="' + id + '"]');
-                        if (card.length) {
-                            card.find('.dashboard-card-value').text(data.value);
-                        }
-                    });
-                })
-                .catch(function(error) {
-                    console.error("Failed to refresh dashboard data:", error);
                 });
+            });
+            this.$('.dashboard-card-col:not(.dashboard-card-lazy)').each(function() {
+                self._visibilityObserver.observe(this);
+            });
         },
-        
+
+        _setupLazyLoading: function() {
+            var self = this;
+            if (this._lazyObserver) {
+                this._lazyObserver.disconnect();
+            }
+            var $lazy = this.$('.dashboard-card-lazy');
+            if (!$lazy.length) {
+                return;
+            }
+            if (!('IntersectionObserver' in window)) {
+                this._loadCards($lazy);
+                return;
+            }
+            this._lazyObserver = new IntersectionObserver(function(entries) {
+                var visible = _.filter(entries, function(entry) { return entry.isIntersecting; });
+                if (!visible.length) {
+                    return;
+                }
+                _.each(visible, function(entry) {
+                    self._lazyObserver.unobserve(entry.target);
+                });
+                self._loadCards($(_.pluck(visible, 'target')));
+            }, {rootMargin: '200px'});
+            $lazy.each(function() {
+                self._lazyObserver.observe(this);
+            });
+        },
+
+        _loadCards: function($cards) {
+            var self = this;
+            var ids = $cards.map(function() {
+                return $(this).data('component-id');
+            }).get();
+            ajax.jsonRpc('/dashboard/get_components', 'call', {
+                board_id: this.boardId,
+                component_ids: ids,
+            }).then(function(result) {
+                if (result.error) {
+                    console.error("Error loading dashboard cards:", result.error);
+                    return;
+                }
+                _.each(result.fragments, function(html, id) {
+                    self.$('.dashboard-card-lazy[data-component-id="' + id + '"]').replaceWith(html);
+                });
+                self._setupVisibilityTracking();
+            }).catch(function(error) {
+                console.error("Failed to load dashboard cards:", error);
+            });
+        },
+
+        _getLoadedComponentIds: function() {
+            return this.$('.dashboard-card-col:not(.dashboard-card-lazy)').map(function() {
+                return $(this).data('component-id');
+            }).get();
+        },
+
+        /**
+         * Ids of the loaded cards currently on screen (all loaded cards when
+         * visibility cannot be observed). Called by the refresh coordinator.
+         */
+        getVisibleComponentIds: function() {
+            if (!this._visibleIds) {
+                return this._getLoadedComponentIds();
+            }
+            return _.map(_.keys(this._visibleIds), function(id) { return parseInt(id); });
+        },
+
+        /**
+         * Update the value of the cards of this widget among the refreshed
+         * ones. Called by the refresh coordinator.
+         */
+        applyValues: function(ids, values, meta, ages) {
+            var self = this;
+            _.each(ids, function(id, index) {
+                var $col = self.$('.dashboard-card-col:not(.dashboard-card-lazy)[data-component-id="' + id + '"]');
+                if (!$col.length) {
+                    return;
+                }
+                var row = meta && meta.rows[id];
+                if (row) {
+                    // Static metadata (name, subtitle, ...) may have been edited since
+                    var card = _.object(meta.fields, row);
+                    card.value = values[index];
+                    self._patchCard($col, card);
+                } else {
+                    $col.find('.dashboard-card-value').text(values[index]);
+                }
+                var age = ages ? ages[index] : 0;
+                // Rate-limited cards keep their last value for a while
+                $col.find('.dashboard-card-value')
+                    .attr('title', age >= 60 ? sprintf(_t("Computed %s min ago"), Math.floor(age / 60)) : null);
+            });
+        },
+
         _fullRefreshContent: function() {
-            console.log('Performing full refresh...');
+            debugLog('Performing full refresh');
             var self = this;
+            var $content = this.$('.dashboard-content');
             // Show loading indicator
-            self.$('.dashboard-content').addClass('o_loading');
-            
-            // Get fresh content
-            ajax.jsonRpc('/dashboard/get_components', 'call', {})
+            $content.addClass('o_loading');
+
+            // Get the structured card list; HTML only comes back for cards
+            // that are not on the page yet
+            ajax.jsonRpc('/dashboard/get_components', 'call', {
+                board_id: this.boardId,
+                structured: true,
+                known_ids: this.$('.dashboard-card-col').map(function() {
+                    return $(this).data('component-id');
+                }).get(),
+            })
                 .then(function (result) {
-                    console.log('Full refresh result:', result);
+                    debugLog('Full refresh result:', result);
                     if (result.error) {
                         console.error("Error refreshing dashboard:", result.error);
-                        self.$('.dashboard-content').removeClass('o_loading');
+                        $content.removeClass('o_loading');
                         return;
                     }
-                    
-                    // Replace the entire content
-                    self.$('.dashboard-content').html(result.html);
-                    self.$('.dashboard-content').removeClass('o_loading');
+
+                    self._patchCards(result.cards, result.fragments);
+                    $content.removeClass('o_loading');
+                    self._setupLazyLoading();
+                    self._setupVisibilityTracking();
                 })
                 .catch(function(error) {
                     console.error("Failed to refresh dashboard:", error);
-                    self.$('.dashboard-content').removeClass('o_loading');
+                    $content.removeClass('o_loading');
                 });
         },
-        
+
+        /**
+         * Bring the cards in line with the server's ordered card list,
+         * touching only the cards, text and attributes that changed.
+         */
+        _patchCards: function(cards, fragments) {
+            var self = this;
+            var $row = this.$('.dashboard-content > .row');
+            if (!$row.length) {
+                $row = $('<div class="row"/>').appendTo(this.$('.dashboard-content'));
+            }
+            $row.attr('data-board-id', this.boardId || null);
+            var wanted = {};
+            _.each(cards, function(card) { wanted[card.id] = true; });
+
+            // Drop the cards that left the board
+            $row.children('.dashboard-card-col').each(function() {
+                if (!wanted[$(this).data('component-id')]) {
+                    $(this).remove();
+                }
+            });
+
+            var previous = null;
+            _.each(cards, function(card) {
+                var $col = $row.children('.dashboard-card-col[data-component-id="' + card.id + '"]');
+                if (!$col.length) {
+                    if (!fragments[card.id]) {
+                        return;
+                    }
+                    $col = $(fragments[card.id]);
+                } else if (!card.lazy) {
+                    self._patchCard($col, card);
+                }
+                // Move only when out of order
+                if (previous ? $col.prev()[0] !== previous : $col.index() !== 0) {
+                    if (previous) {
+                        $col.insertAfter(previous);
+                    } else {
+                        $col.prependTo($row);
+                    }
+                }
+                previous = $col[0];
+            });
+        },
+
+        _patchCard: function($col, card) {
+            var $value = $col.find('.dashboard-card-value');
+            if ($value.text() !== String(card.value)) {
+                $value.text(card.value);
+            }
+            var $name = $col.find('.dashboard-card-name');
+            if ($name.text() !== card.name) {
+                $name.text(card.name);
+            }
+            var $subtitle = $col.find('.dashboard-card-subtitle');
+            if ($subtitle.text() !== card.subtitle) {
+                $subtitle.text(card.subtitle);
+            }
+            var $card = $col.children('.card');
+            var color = $card.attr('data-card-color');
+            if (color !== card.color) {
+                $card.removeClass('bg-' + color).addClass('bg-' + card.color).attr('data-card-color', card.color);
+            }
+            var $icon = $col.find('.dashboard-card-icon');
+            var iconClass = (card.icon || 'd-none') + ' fa-2x me-3 dashboard-card-icon';
+            if ($icon.attr('class') !== iconClass) {
+                $icon.attr('class', iconClass);
+            }
+        },
+
         destroy: function() {
-            // Clean up any event handlers
-            if (this.$refreshBtn) {
-                this.$refreshBtn.off('click');
+            if (this._lazyObserver) {
+                this._lazyObserver.disconnect();
+            }
+            if (this._visibilityObserver) {
+                this._visibilityObserver.disconnect();
             }
+            RefreshCoordinator.unregister(this);
             this._super.apply(this, arguments);
         }
     });
     
-    // Force initialization on page load
-    $(document).ready(function() {
-        console.log("Document ready, checking for dashboard components");
-        if ($('.dashboard-component').length > 0) {
-            console.log("Found dashboard components on page");
-        }
-    });
-    
-    return publicWidget.registry.dashboardWidget;
-});
\ No newline at end of file
+    DashboardLoader.Dashboard = DashboardWidget;
+    return DashboardWidget;
+});
@@ -0,0 +1,6 @@
+from . import fragment_cache
+from . import hyperloglog
+from . import metrics
+from . import record_stream
+from . import single_flight
+from . import structured_logging
@@ -0,0 +1,50 @@
+import threading
+from collections import OrderedDict
+
+
+class FragmentCache:
+    """Bounded, thread-safe LRU store for rendered card HTML.
+
+    Keys carry everything the rendered output depends on (database, component
+    write_date, value hash, language), so entries never need explicit
+    invalidation: a changed card simply produces a new key and the old entry
+    ages out of the LRU.
+    """
+
+    def __init__(self, max_entries=2048):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            try:
+                value = self._entries[key]
+            except KeyError:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# Shared by every worker thread of this process
+fragment_cache = FragmentCache()
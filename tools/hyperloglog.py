@@ -0,0 +1,123 @@
+import hashlib
+import math
+import struct
+
+MIN_PRECISION = 4
+MAX_PRECISION = 16
+
+_DENSE = b'D'
+_SPARSE = b'S'
+
+
+def precision_for_error(error):
+    """Smallest precision whose relative standard error (1.04 / sqrt(2^p)) is <= ``error``"""
+    if not error or error <= 0:
+        return MAX_PRECISION
+    precision = math.ceil(2 * math.log2(1.04 / error))
+    return max(MIN_PRECISION, min(MAX_PRECISION, precision))
+
+
+class HyperLogLog:
+    """HyperLogLog distinct-count sketch over 64-bit hashes.
+
+    Sketches of the same precision merge losslessly (register-wise max), and a
+    sketch can be folded down to any lower precision, so per-day sketches
+    stored at one precision can answer queries at a coarser error.
+    """
+
+    def __init__(self, precision=12, registers=None):
+        if not MIN_PRECISION <= precision <= MAX_PRECISION:
+            raise ValueError("HyperLogLog precision must be between %s and %s" % (MIN_PRECISION, MAX_PRECISION))
+        self.precision = precision
+        self.m = 1 << precision
+        self.registers = bytearray(registers) if registers is not None else bytearray(self.m)
+        if len(self.registers) != self.m:
+            raise ValueError("Expected %s registers, got %s" % (self.m, len(self.registers)))
+
+    @staticmethod
+    def _hash(value):
+        digest = hashlib.blake2b(str(value).encode('utf-8'), digest_size=8).digest()
+        return struct.unpack('>Q', digest)[0]
+
+    def add(self, value):
+        h = self._hash(value)
+        index = h >> (64 - self.precision)
+        # Position of the first set bit in the remaining 64 - p bits
+        rest = (h << self.precision) & 0xFFFFFFFFFFFFFFFF
+        rank = 64 - rest.bit_length() + 1 if rest else 64 - self.precision + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def update(self, values):
+        for value in values:
+            self.add(value)
+        return self
+
+    def merge(self, other):
+        """Merge ``other`` into this sketch, folding it first if it is more precise"""
+        if other.precision != self.precision:
+            if other.precision < self.precision:
+                raise ValueError("Cannot merge a coarser sketch into a more precise one")
+            other = other.fold(self.precision)
+        registers = self.registers
+        for index, rank in enumerate(other.registers):
+            if rank > registers[index]:
+                registers[index] = rank
+        return self
+
+    def fold(self, precision):
+        """Return an equivalent sketch at a lower precision"""
+        if precision == self.precision:
+            return HyperLogLog(precision, self.registers)
+        if precision > self.precision:
+            raise ValueError("Cannot fold a sketch to a higher precision")
+        shift = self.precision - precision
+        folded = HyperLogLog(precision)
+        for index, rank in enumerate(self.registers):
+            if not rank:
+                continue
+            # The dropped index bits become the leading bits of the remainder
+            dropped = index & ((1 << shift) - 1)
+            new_rank = shift - dropped.bit_length() + 1 if dropped else shift + rank
+            new_index = index >> shift
+            if new_rank > folded.registers[new_index]:
+                folded.registers[new_index] = new_rank
+        return folded
+
+    def count(self):
+        m = self.m
+        if m >= 128:
+            alpha = 0.7213 / (1 + 1.079 / m)
+        else:
+            alpha = {16: 0.673, 32: 0.697, 64: 0.709}[m]
+        estimate = alpha * m * m / sum(2.0 ** -rank for rank in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            # Small range correction: linear counting
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+    @property
+    def relative_error(self):
+        return 1.04 / math.sqrt(self.m)
+
+    def to_bytes(self):
+        """Serialize, storing only the non-empty registers when that is smaller"""
+        nonzero = [(index, rank) for index, rank in enumerate(self.registers) if rank]
+        header = bytes([self.precision])
+        if len(nonzero) * 3 < self.m:
+            return _SPARSE + header + b''.join(struct.pack('>HB', index, rank) for index, rank in nonzero)
+        return _DENSE + header + bytes(self.registers)
+
+    @classmethod
+    def from_bytes(cls, data):
+        kind, precision, payload = data[:1], data[1], data[2:]
+        if kind == _DENSE:
+            return cls(precision, payload)
+        if kind != _SPARSE:
+            raise ValueError("Unknown HyperLogLog encoding")
+        sketch = cls(precision)
+        for offset in range(0, len(payload), 3):
+            index, rank = struct.unpack_from('>HB', payload, offset)
+            sketch.registers[index] = rank
+        return sketch
@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""Load test simulating concurrent dashboard viewers
+
+Standalone script, not loaded by Odoo. Each simulated viewer logs in with
+its own session, loads the dashboard once (``/dashboard/get_components``)
+and then polls ``/dashboard/refresh_data`` like the snippet does, with an
+occasional full refresh. Sessions alternate between the facilitator and
+participant accounts given on the command line, so both the shared and the
+per-user card scopes are exercised.
+
+Throughput and latency percentiles are reported per route. Database
+queries per second come from the module's ``/dashboard/metrics`` endpoint
+(SQL statements of the dashboard routes, as counted by the worker that
+answered the scrape, so run Odoo with ``--workers=0`` or one worker) and,
+with ``--dsn``, from PostgreSQL itself: ``pg_stat_statements`` when the
+extension is installed, committed transactions otherwise.
+
+Requires ``aiohttp``; ``--dsn`` also requires ``psycopg2``. Example::
+
+    python3 tools/load_test.py --db mydb --sessions 200 --duration 120 \\
+        --facilitator fac1:secret --participant part1:secret \\
+        --metrics-token TOKEN --dsn "dbname=mydb"
+"""
+import argparse
+import asyncio
+import itertools
+import random
+import re
+import sys
+import time
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+try:
+    import psycopg2
+except ImportError:
+    psycopg2 = None
+
+PERCENTILES = (50, 90, 95, 99)
+
+_SQL_QUERIES_SUM = re.compile(r'^dashboard_request_sql_queries_sum\{[^}]*\} (\S+)$', re.M)
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(int(round(pct / 100.0 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+class Stats:
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+
+    def record(self, route, latency, ok):
+        self.latencies.setdefault(route, []).append(latency)
+        if not ok:
+            self.errors[route] = self.errors.get(route, 0) + 1
+
+    def report(self, elapsed):
+        lines = ['%-22s %8s %7s %8s %s %8s' % (
+            'route', 'requests', 'errors', 'req/s',
+            ' '.join('%8s' % ('p%s ms' % pct) for pct in PERCENTILES), 'max ms')]
+        all_latencies = []
+        for route in sorted(self.latencies):
+            latencies = sorted(self.latencies[route])
+            all_latencies += latencies
+            lines.append(self._row(route, latencies, self.errors.get(route, 0), elapsed))
+        lines.append(self._row('total', sorted(all_latencies), sum(self.errors.values()), elapsed))
+        return '\n'.join(lines)
+
+    def _row(self, route, latencies, errors, elapsed):
+        return '%-22s %8s %7s %8.1f %s %8.1f' % (
+            route, len(latencies), errors, len(latencies) / elapsed,
+            ' '.join('%8.1f' % (percentile(latencies, pct) * 1000) for pct in PERCENTILES),
+            (latencies[-1] if latencies else 0.0) * 1000)
+
+
+class Viewer:
+    """One simulated browser tab showing the dashboard"""
+
+    def __init__(self, args, login, password, stats):
+        self.args = args
+        self.login = login
+        self.password = password
+        self.stats = stats
+        self._ids = itertools.count(1)
+
+    async def _rpc(self, session, path, params):
+        payload = {'jsonrpc': '2.0', 'method': 'call', 'params': params, 'id': next(self._ids)}
+        async with session.post(self.args.url + path, json=payload) as response:
+            body = await response.json(content_type=None)
+        if response.status >= 400 or 'error' in body:
+            return False, body
+        result = body.get('result')
+        return not (isinstance(result, dict) and 'error' in result), result
+
+    async def _timed(self, route, request):
+        started = time.monotonic()
+        try:
+            ok = await request
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+            ok = False
+        self.stats.record(route, time.monotonic() - started, ok)
+
+    async def _get_components(self, session):
+        ok, __ = await self._rpc(session, '/dashboard/get_components', {'board_id': self.args.board_id})
+        return ok
+
+    async def _refresh(self, session):
+        if self.args.compact:
+            params = {'board_id': self.args.board_id} if self.args.board_id else {}
+            async with session.get(self.args.url + '/dashboard/refresh_data/compact', params=params) as response:
+                body = await response.json(content_type=None)
+            return response.status < 400 and 'error' not in body
+        ok, __ = await self._rpc(session, '/dashboard/refresh_data', {'board_id': self.args.board_id})
+        return ok
+
+    async def run(self, start_delay, deadline):
+        await asyncio.sleep(start_delay)
+        timeout = aiohttp.ClientTimeout(total=self.args.timeout)
+        async with aiohttp.ClientSession(timeout=timeout, cookie_jar=aiohttp.CookieJar(unsafe=True)) as session:
+            started = time.monotonic()
+            try:
+                ok, result = await self._rpc(session, '/web/session/authenticate', {
+                    'db': self.args.db, 'login': self.login, 'password': self.password})
+                ok = ok and bool((result or {}).get('uid'))
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+                ok = False
+            self.stats.record('login', time.monotonic() - started, ok)
+            if not ok:
+                return
+            # Page load, then polling
+            await self._timed('get_components', self._get_components(session))
+            while True:
+                # Browsers drift apart; keep the requests spread out
+                delay = self.args.interval * random.uniform(0.8, 1.2)
+                # Stop at the deadline rather than after a last full interval
+                await asyncio.sleep(max(min(delay, deadline - time.monotonic()), 0))
+                if time.monotonic() >= deadline:
+                    return
+                if random.random() < self.args.full_refresh_ratio:
+                    await self._timed('get_components', self._get_components(session))
+                else:
+                    await self._timed('refresh_data', self._refresh(session))
+
+
+async def scrape_sql_queries(args):
+    """Total SQL statements of the dashboard routes, from /dashboard/metrics"""
+    if not args.metrics_token:
+        return None
+    headers = {'Authorization': 'Bearer %s' % args.metrics_token}
+    async with aiohttp.ClientSession() as session:
+        async with session.get(args.url + '/dashboard/metrics', headers=headers) as response:
+            if response.status != 200:
+                return None
+            text = await response.text()
+    return sum(float(value) for value in _SQL_QUERIES_SUM.findall(text))
+
+
+def read_pg_counter(dsn):
+    """(description, counter) of the database activity since the stats reset"""
+    if not dsn or psycopg2 is None:
+        return None
+    conn = psycopg2.connect(dsn)
+    try:
+        with conn.cursor() as cr:
+            cr.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_stat_statements'")
+            if cr.fetchone():
+                cr.execute("""
+                    SELECT coalesce(sum(calls), 0) FROM pg_stat_statements s
+                      JOIN pg_database d ON d.oid = s.dbid
+                     WHERE d.datname = current_database()
+                """)
+                return 'queries', cr.fetchone()[0]
+            cr.execute("""
+                SELECT xact_commit + xact_rollback FROM pg_stat_database
+                 WHERE datname = current_database()
+            """)
+            return 'transactions', cr.fetchone()[0]
+    finally:
+        conn.close()
+
+
+def parse_accounts(values):
+    accounts = []
+    for value in values or []:
+        login, sep, password = value.partition(':')
+        if not sep:
+            raise SystemExit("Accounts are given as login:password, got %r" % value)
+        accounts.append((login, password))
+    return accounts
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate concurrent dashboard viewers against an Odoo instance")
+    parser.add_argument('--url', default='http://localhost:8069', help="Odoo base URL")
+    parser.add_argument('--db', required=True, help="Database to log in to")
+    parser.add_argument('--facilitator', action='append', metavar='LOGIN:PASSWORD',
+                        help="Facilitator account (repeatable)")
+    parser.add_argument('--participant', action='append', metavar='LOGIN:PASSWORD',
+                        help="Participant account (repeatable)")
+    parser.add_argument('--facilitator-ratio', type=float, default=0.2,
+                        help="Share of the sessions using facilitator accounts")
+    parser.add_argument('--sessions', type=int, default=50, help="Concurrent simulated viewers")
+    parser.add_argument('--duration', type=float, default=60, help="Test duration in seconds")
+    parser.add_argument('--ramp-up', type=float, default=10, help="Seconds over which the sessions start")
+    parser.add_argument('--interval', type=float, default=60, help="Seconds between two polls of a viewer")
+    parser.add_argument('--full-refresh-ratio', type=float, default=0.05,
+                        help="Share of the polls that are full refreshes (get_components)")
+    parser.add_argument('--board-id', type=int, help="Board shown by the dashboard")
+    parser.add_argument('--compact', action='store_true',
+                        help="Poll the compact GET endpoint instead of the JSON-RPC one")
+    parser.add_argument('--timeout', type=float, default=60, help="Request timeout in seconds")
+    parser.add_argument('--metrics-token', help="dashboard_custom.metrics_token, to scrape /dashboard/metrics")
+    parser.add_argument('--dsn', help="libpq connection string of the database, to read its statistics")
+    return parser.parse_args(argv)
+
+
+async def main(args):
+    facilitators = parse_accounts(args.facilitator)
+    participants = parse_accounts(args.participant)
+    if not facilitators and not participants:
+        raise SystemExit("Give at least one --facilitator or --participant account")
+
+    stats = Stats()
+    viewers = []
+    for index in range(args.sessions):
+        use_facilitator = facilitators and (not participants or random.random() < args.facilitator_ratio)
+        pool = facilitators if use_facilitator else participants
+        login, password = pool[index % len(pool)]
+        viewers.append(Viewer(args, login, password, stats))
+
+    sql_before = await scrape_sql_queries(args)
+    pg_before = read_pg_counter(args.dsn)
+    started = time.monotonic()
+    deadline = started + args.duration
+    await asyncio.gather(*(
+        viewer.run(args.ramp_up * index / max(len(viewers), 1), deadline)
+        for index, viewer in enumerate(viewers)
+    ))
+    # Requests still in flight at the deadline finish after it; rates are
+    # given over the test window
+    elapsed = min(time.monotonic() - started, args.duration)
+    sql_after = await scrape_sql_queries(args)
+    pg_after = read_pg_counter(args.dsn)
+
+    print("%s sessions (%s facilitator, %s participant accounts) for %.1fs" % (
+        args.sessions, len(facilitators), len(participants), elapsed))
+    print(stats.report(elapsed))
+    if sql_before is not None and sql_after is not None:
+        print("dashboard SQL statements/s: %.1f" % ((sql_after - sql_before) / elapsed))
+    if pg_before and pg_after:
+        print("database %s/s: %.1f" % (pg_after[0], (pg_after[1] - pg_before[1]) / elapsed))
+
+
+if __name__ == '__main__':
+    if aiohttp is None:
+        sys.exit("The load test requires aiohttp: pip install aiohttp")
+    asyncio.run(main(parse_args()))
@@ -0,0 +1,310 @@
+import fcntl
+import json
+import math
+import os
+import threading
+import time
+import uuid
+
+from .fragment_cache import fragment_cache
+from .single_flight import single_flight
+
+# Seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Seconds between two writes of a process' metrics to the shared directory
+DUMP_INTERVAL = 5
+
+# Snapshot file of the processes that exited, see MetricsRegistry._archive
+_ARCHIVE = 'archive.json'
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(labelnames, labelvalues, extra=()):
+    pairs = list(zip(labelnames, labelvalues)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (
+        '%s="%s"' % (name, str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"'))
+        for name, value in pairs
+    )
+    return '{%s}' % ','.join(escaped)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.registry = None
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError("%s expects labels %s" % (self.name, self.labelnames))
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _changed(self):
+        if self.registry is not None:
+            self.registry.maybe_dump()
+
+    def snapshot(self):
+        """JSON-serializable copy of the values: [[label values, value]]"""
+        with self._lock:
+            return json.loads(json.dumps([[list(key), value] for key, value in self._values.items()]))
+
+    def merge(self, values, samples):
+        """Add the ``samples`` of a snapshot to ``values`` ({key: value})"""
+        for key, value in samples:
+            key = tuple(key)
+            values[key] = values[key] + value if key in values else value
+
+    def render(self, values):
+        lines = [
+            '# HELP %s %s' % (self.name, self.documentation),
+            '# TYPE %s %s' % (self.name, self.kind),
+        ]
+        return lines + self._render_samples(values)
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+        self._changed()
+
+    def _render_samples(self, values):
+        return [
+            '%s%s %s' % (self.name, _format_labels(self.labelnames, key), _format_value(value))
+            for key, value in sorted(values.items())
+        ]
+
+
+class CallbackMetric(_Metric):
+    """Counter or gauge whose value is read from a callback at render time,
+    for statistics already kept elsewhere"""
+
+    def __init__(self, name, documentation, callback, kind='gauge'):
+        super().__init__(name, documentation)
+        self.callback = callback
+        self.kind = kind
+
+    def snapshot(self):
+        return [[[], self.callback()]]
+
+    def _render_samples(self, values):
+        return ['%s %s' % (self.name, _format_value(value)) for value in values.values()]
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+        self._changed()
+
+    def merge(self, values, samples):
+        for key, (counts, total, count) in samples:
+            key = tuple(key)
+            state = values.get(key)
+            if state is None:
+                values[key] = [list(counts), total, count]
+                continue
+            state[0] = [a + b for a, b in zip(state[0], counts)]
+            state[1] += total
+            state[2] += count
+
+    def _render_samples(self, values):
+        lines = []
+        for key, (counts, total, count) in sorted(values.items()):
+            for bound, bucket_count in zip(self.buckets, counts):
+                labels = _format_labels(self.labelnames, key, [('le', _format_value(bound))])
+                lines.append('%s_bucket%s %s' % (self.name, labels, bucket_count))
+            labels = _format_labels(self.labelnames, key)
+            lines.append('%s_sum%s %s' % (self.name, labels, _format_value(total)))
+            lines.append('%s_count%s %s' % (self.name, labels, count))
+        return lines
+
+
+class MetricsRegistry:
+    """Metrics registry rendered in the Prometheus text format, aggregated
+    over the processes of the server.
+
+    Each process updates its metrics in memory and writes a snapshot of
+    them to its own file of a shared directory, at most every
+    ``DUMP_INTERVAL`` seconds. A scrape, answered by any worker, adds up the
+    snapshots of all processes: counters and histograms keep growing
+    whichever worker answers, as long as the processes write to the same
+    directory (the same host). The snapshots of exited processes are folded
+    into an archive, except for their gauges.
+    """
+
+    def __init__(self, directory=None):
+        self._metrics = []
+        self.directory = directory
+        self._token = '%s-%s' % (os.getpid(), uuid.uuid4().hex[:8])
+        self._dump_lock = threading.Lock()
+        self._last_dump = 0.0
+
+    def register(self, metric):
+        metric.registry = self
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def callback(self, name, documentation, callback, kind='gauge'):
+        return self.register(CallbackMetric(name, documentation, callback, kind))
+
+    def _get_directory(self):
+        if self.directory is None:
+            from odoo.tools import config
+            self.directory = os.path.join(config['data_dir'], 'dashboard_metrics')
+        os.makedirs(self.directory, exist_ok=True)
+        return self.directory
+
+    def maybe_dump(self, force=False):
+        """Write this process' snapshot, unless done less than DUMP_INTERVAL ago"""
+        if not force and time.monotonic() - self._last_dump < DUMP_INTERVAL:
+            return
+        if not self._dump_lock.acquire(blocking=force):
+            # Another thread is writing it
+            return
+        try:
+            if self._token.split('-')[0] != str(os.getpid()):
+                # Forked worker: its values are its own from now on
+                self._token = '%s-%s' % (os.getpid(), uuid.uuid4().hex[:8])
+            self._last_dump = time.monotonic()
+            snapshot = {metric.name: metric.snapshot() for metric in self._metrics}
+            directory = self._get_directory()
+            path = os.path.join(directory, '%s.json' % self._token)
+            with open(path + '.tmp', 'w') as f:
+                json.dump(snapshot, f)
+            os.replace(path + '.tmp', path)
+        finally:
+            self._dump_lock.release()
+
+    def _read(self, path):
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _archive(self, directory, dead):
+        """Fold the snapshots of exited processes into the archive, without
+        their gauges, which only describe running processes"""
+        with open(os.path.join(directory, '.lock'), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            archive_path = os.path.join(directory, _ARCHIVE)
+            archive = self._read(archive_path)
+            merged = {}
+            for metric in self._metrics:
+                if metric.kind == 'gauge':
+                    continue
+                values = {}
+                for snapshot in [archive] + [self._read(path) for path in dead if os.path.exists(path)]:
+                    metric.merge(values, snapshot.get(metric.name, []))
+                merged[metric.name] = [[list(key), value] for key, value in values.items()]
+            with open(archive_path + '.tmp', 'w') as f:
+                json.dump(merged, f)
+            os.replace(archive_path + '.tmp', archive_path)
+            for path in dead:
+                if os.path.exists(path):
+                    os.unlink(path)
+
+    def render(self):
+        self.maybe_dump(force=True)
+        directory = self._get_directory()
+        live, dead = [], []
+        for name in os.listdir(directory):
+            if not name.endswith('.json') or name == _ARCHIVE:
+                continue
+            path = os.path.join(directory, name)
+            try:
+                os.kill(int(name.split('-')[0]), 0)
+            except (ValueError, ProcessLookupError):
+                dead.append(path)
+                continue
+            except PermissionError:
+                pass
+            live.append(path)
+        if dead:
+            self._archive(directory, dead)
+
+        snapshots = [self._read(os.path.join(directory, _ARCHIVE))] + [self._read(path) for path in live]
+        lines = []
+        for metric in self._metrics:
+            values = {}
+            for snapshot in snapshots:
+                metric.merge(values, snapshot.get(metric.name, []))
+            lines += metric.render(values)
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+# Dashboard subsystem metrics
+
+REQUESTS = registry.counter(
+    'dashboard_requests_total', "Dashboard HTTP requests", ('route', 'status'))
+REQUEST_DURATION = registry.histogram(
+    'dashboard_request_duration_seconds', "Dashboard request handling time", ('route',))
+REQUEST_SQL_QUERIES = registry.histogram(
+    'dashboard_request_sql_queries', "SQL statements executed per dashboard request", ('route',),
+    buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000))
+RESPONSE_BYTES = registry.histogram(
+    'dashboard_response_bytes', "Dashboard response payload size (sampled for JSON-RPC routes)", ('route',),
+    buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576))
+CARD_COMPUTE_DURATION = registry.histogram(
+    'dashboard_card_compute_seconds', "Card value computation time", ('component_id',))
+CARD_ERRORS = registry.counter(
+    'dashboard_card_errors_total', "Card computations that produced an error value", ('component_id',))
+CACHE_REQUESTS = registry.counter(
+    'dashboard_cache_requests_total', "Card value lookups by outcome", ('cache', 'result'))
+registry.callback(
+    'dashboard_fragment_cache_hits_total', "Rendered card fragments served from the cache",
+    lambda: fragment_cache.hits, kind='counter')
+registry.callback(
+    'dashboard_fragment_cache_misses_total', "Rendered card fragments missing from the cache",
+    lambda: fragment_cache.misses, kind='counter')
+registry.callback(
+    'dashboard_fragment_cache_evictions_total', "Card fragments evicted from the cache",
+    lambda: fragment_cache.evictions, kind='counter')
+registry.callback(
+    'dashboard_fragment_cache_entries', "Card fragments currently cached",
+    lambda: len(fragment_cache))
+registry.callback(
+    'dashboard_single_flight_coalesced_total', "Card computations shared with an identical one in flight",
+    lambda: single_flight.coalesced, kind='counter')
@@ -0,0 +1,87 @@
+from odoo.models import BaseModel
+from odoo.osv import expression
+
+# Records loaded at once; matches the ORM prefetch batch
+DEFAULT_CHUNK_SIZE = 1000
+
+
+class RecordStream:
+    """Records matching a domain, read in fixed-size chunks
+
+    Chunks are paged on id (keyset pagination), so only one chunk of ids is
+    held at a time, and the cached fields of each chunk are dropped once it
+    is consumed: memory stays bounded whatever the number of matching
+    records. The reductions below are exposed to card formulas.
+    """
+
+    def __init__(self, model, domain, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.model = model
+        self.domain = list(domain or [])
+        self.chunk_size = max(int(chunk_size or DEFAULT_CHUNK_SIZE), 1)
+
+    def chunks(self):
+        """Yield recordsets of at most ``chunk_size`` records, in id order"""
+        last_id = 0
+        while True:
+            chunk = self.model.search(
+                expression.AND([self.domain, [('id', '>', last_id)]]), order='id', limit=self.chunk_size)
+            if not chunk:
+                return
+            last_id = chunk.ids[-1]
+            yield chunk
+            # Drop the fields prefetched for this chunk before the next one,
+            # leaving the rest of the environment cache alone
+            chunk.invalidate_recordset()
+            if len(chunk) < self.chunk_size:
+                return
+
+    def values(self, field):
+        """Yield the values of ``field`` (a field name or dotted path), chunk by chunk
+
+        Same values as ``mapped(field)`` on all the matching records at once:
+        records reached through a dotted path are only counted once, even
+        when reached from several chunks. Their ids are kept to that end, and
+        they are dropped from the cache along with each chunk.
+        """
+        *path, name = field.split('.')
+        seen, seen_leaves = set(), set()
+        for chunk in self.chunks():
+            traversed = []
+            records = chunk
+            for step in path:
+                records = records.mapped(step)
+                traversed.append(records)
+            if path:
+                new_ids = [record_id for record_id in records.ids if record_id not in seen]
+                seen.update(new_ids)
+                records = records.browse(new_ids)
+            values = records.mapped(name)
+            if isinstance(values, BaseModel):
+                # Relational leaf: records, also counted once overall
+                traversed.append(values)
+                values = values.browse([value_id for value_id in values.ids if value_id not in seen_leaves])
+                seen_leaves.update(values.ids)
+            yield from values
+            for related in traversed:
+                related.invalidate_recordset()
+
+    def count(self, predicate=None):
+        if predicate is None:
+            return self.model.search_count(self.domain)
+        return sum(len(chunk.filtered(predicate)) for chunk in self.chunks())
+
+    def sum(self, field):
+        return sum(value or 0 for value in self.values(field))
+
+    def avg(self, field):
+        total = count = 0
+        for value in self.values(field):
+            total += value or 0
+            count += 1
+        return total / count if count else 0
+
+    def min(self, field):
+        return min((value for value in self.values(field) if value is not None), default=0)
+
+    def max(self, field):
+        return max((value for value in self.values(field) if value is not None), default=0)
@@ -0,0 +1,84 @@
+import logging
+import random
+import time
+
+# Seconds between two reloads of the sampling rates from the system parameters
+CONFIG_REFRESH_INTERVAL = 60
+
+_loggers = {}
+_last_configured = 0.0
+
+
+class SampledLogger:
+    """Logger for hot paths: lazy formatting, sampling and structured fields.
+
+    Messages are only formatted when the record is actually emitted, and
+    only a ``sample_rate`` fraction of the calls is emitted. Keyword fields,
+    plus the dashboard request id and component id, are appended to the
+    message as ``key=value`` pairs and attached to the record as
+    ``dashboard_<key>`` attributes for structured handlers.
+
+    Components with ``debug_logging`` enabled bypass sampling and are logged
+    at INFO level at least, so a single card can be traced in production.
+    """
+
+    def __init__(self, name, sample_rate=1.0):
+        self.logger = logging.getLogger(name)
+        self.sample_rate = sample_rate
+
+    def _log(self, level, msg, args, component=None, **fields):
+        traced = bool(component) and component.debug_logging
+        if traced:
+            level = max(level, logging.INFO)
+        if not self.logger.isEnabledFor(level):
+            return
+        if not traced and self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return
+
+        if component:
+            fields.setdefault('request_id', component.env.context.get('dashboard_request_id'))
+            fields.setdefault('component_id', component.id)
+        fields = {key: value for key, value in fields.items() if value is not None}
+        if fields:
+            msg = '%s [%s]' % (msg, ' '.join('%s=%%s' % key for key in fields))
+            args = args + tuple(fields.values())
+        extra = {'dashboard_%s' % key: value for key, value in fields.items()}
+        self.logger.log(level, msg, *args, extra=extra)
+
+    def debug(self, msg, *args, **kwargs):
+        self._log(logging.DEBUG, msg, args, **kwargs)
+
+    def info(self, msg, *args, **kwargs):
+        self._log(logging.INFO, msg, args, **kwargs)
+
+    def warning(self, msg, *args, **kwargs):
+        self._log(logging.WARNING, msg, args, **kwargs)
+
+
+def get_sampled_logger(name):
+    logger = _loggers.get(name)
+    if logger is None:
+        logger = _loggers[name] = SampledLogger(name)
+    return logger
+
+
+def configure_sampling(env, force=False):
+    """Load the sampling rates from the system parameters, at most once per
+    ``CONFIG_REFRESH_INTERVAL``
+
+    ``dashboard_custom.log_sample_rate.<logger name>`` sets the rate of one
+    logger, ``dashboard_custom.log_sample_rate`` the default (1.0).
+    """
+    global _last_configured
+    now = time.monotonic()
+    if not force and now - _last_configured < CONFIG_REFRESH_INTERVAL:
+        return
+    _last_configured = now
+    ICP = env['ir.config_parameter'].sudo()
+    default = ICP.get_param('dashboard_custom.log_sample_rate', '1.0')
+    for name, logger in _loggers.items():
+        rate = ICP.get_param('dashboard_custom.log_sample_rate.%s' % name, default)
+        try:
+            logger.sample_rate = min(max(float(rate), 0.0), 1.0)
+        except ValueError:
+            logger.sample_rate = 1.0